@@ -0,0 +1,107 @@
+import logging
+import numpy as np
+
+from apps.game.batch_physics import BALL_VX, BALL_VY, RIGHT_Y
+logger = logging.getLogger(__name__)
+
+# Columns of the per-room buffer
+TARGET, SPEED, TRAJECTORY_VX, TRAJECTORY_VY, REACT_AT, INTERVAL = range(6)
+# Columns of the per-room move buffer
+UP, DOWN = range(2)
+
+
+class AIController:
+    """
+    Moves the computer paddle of every PVC room in one vectorized pass per
+    tick, on the rows of BatchPhysics.
+
+    Produces the same results as GameLoop.update_ai_paddle(). A new
+    prediction is only needed when a ball changes course, a few times a
+    second per room, so those rooms are found with one array comparison and
+    predict on their own (GameLoop.update_ai_target()). Following the
+    target, the dead zone and the clamp run for all rooms at once.
+
+    The ball and the paddle are read from and written to the engine's rows.
+    What the AI keeps of its own sits in a row of the same index, loaded
+    from game_state.ai whenever the engine loads the room (see
+    BatchPhysics.sync_in()). A tick only copies back the rooms that predict
+    again and the moves that changed.
+    """
+    def __init__(self, config, engine):
+        self.paddle_height = config.paddle_height
+        self.paddle_speed = config.paddle_speed
+        self.max_paddle_y = config.max_paddle_y
+        self.engine = engine
+        self.capacity = 0
+        self.allocate(engine.capacity)
+        engine.ai = self
+
+    def allocate(self, capacity):
+        state = np.zeros((capacity, 6), dtype=np.float64)
+        moves = np.zeros((capacity, 2), dtype=bool)
+        if self.capacity:
+            state[:self.capacity] = self.state
+            moves[:self.capacity] = self.moves
+        self.state, self.moves = state, moves
+        self.capacity = capacity
+
+    def load(self, loop):
+        """
+        Load a loop's row from its game_state.ai.
+        """
+        nan = np.nan
+        row = loop.physics_row
+        ai = loop.game_state.ai
+        trajectory_vx, trajectory_vy = ai.trajectory or (nan, nan)
+        self.state[row] = (
+            nan if ai.predicted_y is None else ai.predicted_y,
+            ai.profile.speed,
+            trajectory_vx, trajectory_vy,
+            nan if ai.react_at is None else ai.react_at,
+            loop.ai_interval,
+        )
+        self.moves[row] = (ai.up, ai.down)
+
+    def step(self, loops, dt):
+        """
+        Move the AI paddle of every room in `loops` by dt. Every loop has
+        been stepped by the engine this tick.
+        """
+        engine = self.engine
+        engine.flush()
+        rows = np.array([loop.physics_row for loop in loops], dtype=np.intp)
+        step = np.array([loop.step_count for loop in loops], dtype=np.float64)
+        state = self.state[rows]
+        physics = engine.state[rows]
+
+        # Rooms whose ball changed course and may predict again this step, or
+        # whose reaction time just ran out. NaN compares unequal, so rooms
+        # without a prediction yet always count as changed.
+        changed = (physics[:, BALL_VX] != state[:, TRAJECTORY_VX]) | (physics[:, BALL_VY] != state[:, TRAJECTORY_VY])
+        due = changed & (np.mod(step, state[:, INTERVAL]) == 0)
+        due |= step >= state[:, REACT_AT]
+        for index in np.flatnonzero(due).tolist():
+            loop = loops[index]
+            loop.pull_physics()
+            loop.update_ai_target()
+            self.load(loop)
+            state[index] = self.state[rows[index]]
+
+        right_y = physics[:, RIGHT_Y]
+        target = state[:, TARGET]
+        ai_speed = self.paddle_speed * state[:, SPEED] * dt
+        paddle_center = right_y + self.paddle_height / 2
+        # False for NaN targets, so a room without one stays put
+        off = np.abs(paddle_center - target) > 15
+        down = off & (paddle_center < target)
+        up = off & (paddle_center > target)
+        right_y = np.where(down, right_y + ai_speed, right_y)
+        right_y = np.where(up, right_y - ai_speed, right_y)
+        engine.state[rows, RIGHT_Y] = np.maximum(0, np.minimum(right_y, self.max_paddle_y))
+        engine.generation += 1
+
+        moves = np.stack((up, down), axis=1)
+        for index in np.flatnonzero((moves != self.moves[rows]).any(axis=1)).tolist():
+            ai = loops[index].game_state.ai
+            ai.up, ai.down = moves[index].tolist()
+        self.moves[rows] = moves
@@ -0,0 +1,235 @@
+import logging
+from array import array
+import numpy as np
+logger = logging.getLogger(__name__)
+
+# Columns of the per-room state buffer
+BALL_X, BALL_Y, BALL_VX, BALL_VY, LEFT_Y, RIGHT_Y = range(6)
+# Columns of the per-room flag buffer
+RENDER, LEFT_UP, LEFT_DOWN, RIGHT_UP, RIGHT_DOWN = range(5)
+# State columns of the lag history, in the order of LagCompensator.columns()
+HISTORY = [LEFT_Y, RIGHT_Y, BALL_X, BALL_Y, BALL_VX]
+
+
+class BatchPhysics:
+    """
+    Steps ball and paddle physics for every simulating room in one vectorized
+    pass. State is kept in struct-of-arrays buffers with one row per room.
+
+    Produces the same results as GameLoop.update_ball_position(),
+    handle_ball_collisions(), handle_scoring() and update_paddles(): every
+    operation is applied in the same order with the same float64 arithmetic.
+    Goal handling stays per room, see GameLoop.batch_tick(); the AI paddles
+    move on the same rows, see ai.py.
+
+    A room gets its row the first time it steps and keeps it until its loop
+    stops. While it has one, the row holds the truth about its ball and
+    paddles and the lag history of the room (see lag.py), so a tick costs
+    no per-room copies:
+    - code that reads the room's game_state calls GameLoop.pull_physics()
+      first, which copies the row out if it was stepped since;
+    - code that changes the ball, the paddles or the players (events, goals,
+      joins and leaves) calls GameLoop.touch_physics(), and the row is loaded
+      from game_state again before the next step.
+    """
+    def __init__(self, config, capacity=64):
+        self.canvas_width = config.canvas_width
+        self.canvas_height = config.canvas_height
+        self.paddle_width = config.paddle_width
+        self.paddle_height = config.paddle_height
+        self.ball_radius = config.ball_radius
+        self.right_paddle_x = config.right_paddle_x
+        self.paddle_speed = config.paddle_speed
+        self.speedup_factor = config.speedup_factor
+        self.history_size = config.max_rewind + 1
+        self.generation = 0  # Passes over the rows, game_state is current if synced at this one
+        self.dirty = []  # Loops whose game_state changed since their row was loaded
+        self.rows = []  # Loop of each row, None if free
+        self.free = []  # Free rows
+        self.stepped = None  # Rows of the last step
+        self.capacity = 0
+        self.ai = None  # AIController keeping its rooms in the same rows, see ai.py
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        state = np.zeros((capacity, 6), dtype=np.float64)
+        flags = np.zeros((capacity, 5), dtype=bool)
+        history = np.zeros((capacity, self.history_size, len(HISTORY)), dtype=np.float64)
+        if self.capacity:
+            state[:self.capacity] = self.state
+            flags[:self.capacity] = self.flags
+            history[:self.capacity] = self.history
+        self.state, self.flags, self.history = state, flags, history
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.rows.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+        if self.ai is not None:
+            self.ai.allocate(capacity)
+        for row, loop in enumerate(self.rows):
+            if loop is not None:
+                self.bind_history(loop)
+
+    def attach(self, loop):
+        """
+        Give a loop its row, loaded from its game_state before the step.
+        """
+        if not self.free:
+            self.allocate(self.capacity * 2)
+        row = self.free.pop()
+        self.rows[row] = loop
+        loop.physics = self
+        loop.physics_row = row
+        loop.physics_dirty = True
+        self.dirty.append(loop)
+        if loop.lag.first is None:
+            loop.lag.first = loop.step_count  # Attached on its first step
+        self.bind_history(loop)
+
+    def detach(self, loop):
+        """
+        Hand a stopped loop's state back to its game_state and free its row.
+        """
+        if loop.physics is not self:
+            return
+        loop.pull_physics()
+        loop.lag.use(*(array('d', bytes(8 * self.history_size)) for _ in HISTORY))
+        row = loop.physics_row
+        self.rows[row] = None
+        self.free.append(row)
+        loop.physics = None
+        loop.physics_row = None
+        loop.physics_dirty = False
+
+    def bind_history(self, loop):
+        history = self.history[loop.physics_row]
+        loop.lag.use(*(history[:, column] for column in range(len(HISTORY))))
+
+    def sync_in(self, loop):
+        """
+        Load a loop's row from its game_state.
+        """
+        row = loop.physics_row
+        game_state = loop.game_state
+        ball = game_state.ball
+        self.state[row] = (ball.x, ball.y, ball.vx, ball.vy, game_state.left.y, game_state.right.y)
+        left_up = left_down = right_up = right_down = False
+        for player in game_state.players.values():
+            if player.side == 'left':
+                left_up, left_down = player.up, player.down
+            else:
+                right_up, right_down = player.up, player.down
+        self.flags[row] = (ball.render, left_up, left_down, right_up, right_down)
+        if self.ai is not None and game_state.ai.active:
+            self.ai.load(loop)
+        loop.physics_dirty = False
+        loop.physics_synced = self.generation
+
+    def sync_out(self, loop):
+        """
+        Copy a loop's row into its game_state.
+        """
+        game_state = loop.game_state
+        ball = game_state.ball
+        ball.x, ball.y, ball.vx, ball.vy, game_state.left.y, game_state.right.y = self.state[loop.physics_row].tolist()
+        loop.physics_synced = self.generation
+
+    def flush(self):
+        """
+        Load the rows of every loop changed outside the engine.
+        """
+        for loop in self.dirty:
+            if loop.physics is self and loop.physics_dirty:
+                self.sync_in(loop)
+        self.dirty = []
+
+    def step(self, loops, dt):
+        """
+        Advance every room in `loops` by dt. Returns two index arrays into
+        `loops`: rooms where the left side scored and where the right scored.
+        """
+        rows = [loop.physics_row for loop in loops]
+        if None in rows:
+            for loop in loops:
+                if loop.physics is not self:
+                    self.attach(loop)
+            rows = [loop.physics_row for loop in loops]
+        self.flush()
+        self.stepped = rows = np.array(rows, dtype=np.intp)
+        state = self.state[rows]
+        left_goals, right_goals = self.step_arrays(state, self.flags[rows], dt)
+        self.state[rows] = state
+        self.generation += 1
+        return left_goals, right_goals
+
+    def record(self, loops):
+        """
+        Write the lag history of the rooms of the last step, once their goals
+        are scored, like the end of GameLoop.update_game_state().
+        """
+        self.flush()
+        rows = self.stepped
+        steps = np.array([loop.step_count for loop in loops], dtype=np.intp)
+        self.history[rows, steps % self.history_size] = self.state[rows][:, HISTORY]
+
+    def step_arrays(self, state, flags, dt):
+        x = state[:, BALL_X]
+        y = state[:, BALL_Y]
+        vx = state[:, BALL_VX]
+        vy = state[:, BALL_VY]
+        left_y = state[:, LEFT_Y]
+        right_y = state[:, RIGHT_Y]
+        render = flags[:, RENDER]
+        radius = self.ball_radius
+        factor = self.speedup_factor
+        half_height = self.paddle_height / 2
+
+        # Ball movement, only for rooms where the ball is in play
+        x[:] = np.where(render, x + vx * dt, x)
+        y[:] = np.where(render, y + vy * dt, y)
+
+        # Bottom wall, then top wall (checked against the updated vy)
+        hit = render & (vy > 0) & (y + radius >= self.canvas_height)
+        vx[:] = np.where(hit, vx * factor, vx)
+        vy[:] = np.where(hit, -vy * factor, vy)
+        hit = render & (vy < 0) & (y - radius <= 0)
+        vx[:] = np.where(hit, vx * factor, vx)
+        vy[:] = np.where(hit, -vy * factor, vy)
+
+        # Left paddle, only while moving left
+        hit = render & (vx < 0) & (x < self.paddle_width) & self.overlaps(y, left_y)
+        relative_hit = (y - (left_y + half_height)) / half_height
+        vx[:] = np.where(hit, -vx * factor, vx)
+        vy[:] = np.where(hit, 600 * relative_hit * factor, vy)
+
+        # Right paddle, only while moving right
+        hit = render & (vx > 0) & (x > self.right_paddle_x) & self.overlaps(y, right_y)
+        relative_hit = (y - (right_y + half_height)) / half_height
+        vx[:] = np.where(hit, -vx * factor, vx)
+        vy[:] = np.where(hit, 600 * relative_hit * factor, vy)
+
+        # Goals
+        right_scored = render & (x < 0)
+        left_scored = render & ~right_scored & (x > self.canvas_width)
+
+        # Paddles, up then down like update_paddles()
+        paddle_step = self.paddle_speed * dt
+        max_paddle_y = self.canvas_height - self.paddle_height
+        left_y[:] = np.where(flags[:, LEFT_UP], left_y - paddle_step, left_y)
+        left_y[:] = np.where(flags[:, LEFT_DOWN], left_y + paddle_step, left_y)
+        right_y[:] = np.where(flags[:, RIGHT_UP], right_y - paddle_step, right_y)
+        right_y[:] = np.where(flags[:, RIGHT_DOWN], right_y + paddle_step, right_y)
+        left_y[:] = np.maximum(0, np.minimum(left_y, max_paddle_y))
+        right_y[:] = np.maximum(0, np.minimum(right_y, max_paddle_y))
+
+        return np.flatnonzero(left_scored), np.flatnonzero(right_scored)
+
+    def overlaps(self, ball_y, paddle_y):
+        """
+        Vertical overlap test of check_paddle_collision().
+        """
+        radius = self.ball_radius
+        ball_top = ball_y - radius
+        ball_bottom = ball_y + radius
+        paddle_bottom = paddle_y + self.paddle_height
+        return (((paddle_y <= ball_top) & (ball_top <= paddle_bottom))
+                | ((paddle_y <= ball_bottom) & (ball_bottom <= paddle_bottom)))
@@ -0,0 +1,234 @@
+"""
+Physics benchmark suite for the game loop.
+
+    cd backend && python -m apps.game.bench --rooms 200 --ticks 1000
+
+Measures per-room state memory, per-room physics CPU, and full headless
+ticks (events, physics, AI, frame encoding) for PVP, PVC and tournament
+rooms on each available physics engine. Runs without Django, Redis or a
+channel layer, see headless.py.
+
+--baseline also measures the first two on rooms kept as nested dicts with
+string keys, the way GameManager held them before state.py, so the saving
+of the slotted state can be reproduced.
+"""
+import argparse, asyncio, gc, random, time, tracemalloc
+
+from apps.game.game_loop import GameLoop
+from apps.game.headless import CONFIG, MODES, StubManager, make_room, run_scenario, format_result
+from apps.game.state import RoomConfig
+
+
+def dict_room(index, mode="PVP"):
+    """
+    A started room as GameManager.initial_game_state() and add_player()
+    built it before state.py.
+    """
+    users = {"PVP": ["1", "2"], "PVC": ["1"], "TRNMT": ["1", "2", "3", "4"]}[mode]
+    kwargs = {'room_id': f"headless-{index}", 'game_type': mode, 'users': users, 'user_id': users[0]}
+    canvas, paddle, ball = CONFIG['canvas'], CONFIG['paddle'], CONFIG['ball']
+    room = {
+        'room_id': kwargs['room_id'],
+        'tournament_id': None,
+        'room_size': len(users),
+        'game_attributes': {**kwargs},
+        'players': {},
+        'spectators': {},
+        'ai': {'active': mode == "PVC", 'since_last_update': None, 'predicted_y': None},
+        'player_ai': {'input': {'up': False, 'down': False}},
+        'ball': {
+            'x': canvas['width'] / 2,
+            'y': canvas['height'] / 2,
+            'vx': ball['speed'] * (-1 if random.random() < 0.5 else 1),
+            'vy': ball['speed'] * (-1 if random.random() < 0.5 else 1),
+            'render': True,
+        },
+        'paddles': {
+            'left': {'x': 0, 'y': canvas['height'] / 2 - 50, 'score': 0},
+            'right': {'x': canvas['width'] - paddle['width'], 'y': canvas['height'] / 2 - 50, 'score': 0},
+        },
+        'game_started': True,
+        'paused': False,
+    }
+    sides = ['left'] if mode == "PVC" else ['left', 'right']
+    for user_id, side in zip(users, sides):
+        room['players'][user_id] = {'side': side, 'input': {'up': False, 'down': False}, 'alias': user_id}
+    for user_id in users[len(sides):]:
+        room['spectators'][user_id] = {'alias': user_id}
+    return room
+
+
+class DictLoop:
+    """
+    GameLoop.update_game_state() as it ran on dict rooms, method for method.
+    A goal only puts the ball back in the middle.
+    """
+    def __init__(self, room):
+        self.game_state = room
+        self.manager = self  # The old code read the config through its manager
+        self.config = CONFIG
+
+    def update_game_state(self, dt):
+        if self.game_state['ball']['render']:
+            self.update_ball_position(dt)
+            self.handle_ball_collisions()
+            self.handle_scoring()
+        self.update_paddles(dt)
+
+    def update_paddles(self, dt):
+        paddle_speed = 550 * dt
+        canvas_height = self.manager.config['canvas']['height']
+        paddle_height = self.manager.config['paddle']['height']
+        for player_data in self.game_state['players'].values():
+            input_data = player_data['input']
+            paddle = self.game_state['paddles'][player_data['side']]
+            if input_data['up']:
+                paddle['y'] -= paddle_speed
+            if input_data['down']:
+                paddle['y'] += paddle_speed
+            max_paddle_y = canvas_height - paddle_height
+            paddle['y'] = max(0, min(paddle['y'], max_paddle_y))
+
+    def update_ball_position(self, dt):
+        ball_state = self.game_state['ball']
+        ball_state['x'] += ball_state['vx'] * dt
+        ball_state['y'] += ball_state['vy'] * dt
+
+    def handle_ball_collisions(self):
+        canvas = self.manager.config['canvas']
+        ball_config = self.manager.config['ball']
+        paddle_config = self.manager.config['paddle']
+        ball_state = self.game_state['ball']
+        left_paddle = self.game_state['paddles']['left']
+        right_paddle = self.game_state['paddles']['right']
+        ball_radius = self.manager.config['ball']['diameter'] / 2
+        speedup_factor = 1.05
+        if ball_state['vy'] > 0:
+            if ball_state['y'] + ball_radius >= canvas['height']:
+                ball_state['vy'] = -ball_state['vy'] * speedup_factor
+                ball_state['vx'] *= speedup_factor
+        if ball_state['vy'] < 0:
+            if ball_state['y'] - ball_radius <= 0:
+                ball_state['vy'] = -ball_state['vy'] * speedup_factor
+                ball_state['vx'] *= speedup_factor
+        if ball_state['vx'] < 0:
+            if self.check_paddle_collision(ball_state, ball_config, left_paddle, paddle_config):
+                self.reflect_ball(ball_state, left_paddle, paddle_config)
+                ball_state['vx'] *= speedup_factor
+                ball_state['vy'] *= speedup_factor
+        if ball_state['vx'] > 0:
+            if self.check_paddle_collision(ball_state, ball_config, right_paddle, paddle_config):
+                self.reflect_ball(ball_state, right_paddle, paddle_config)
+                ball_state['vx'] *= speedup_factor
+                ball_state['vy'] *= speedup_factor
+
+    def check_paddle_collision(self, ball_state, ball_config, paddle, paddle_config):
+        horizontally_collides = False
+        vertically_collides = False
+        ball_radius = ball_config['diameter'] / 2
+        if paddle['x'] == 0:
+            if ball_state['x'] < paddle['x'] + paddle_config['width']:
+                horizontally_collides = True
+        else:
+            if ball_state['x'] > paddle['x']:
+                horizontally_collides = True
+        ball_top = ball_state['y'] - ball_radius
+        ball_bottom = ball_state['y'] + ball_radius
+        paddle_top = paddle['y']
+        paddle_bottom = paddle['y'] + paddle_config['height']
+        if paddle_top <= ball_top <= paddle_bottom or paddle_top <= ball_bottom <= paddle_bottom:
+            vertically_collides = True
+        return horizontally_collides and vertically_collides
+
+    def reflect_ball(self, ball, paddle, paddle_config):
+        relative_hit = (ball['y'] - (paddle['y'] + paddle_config['height'] / 2)) / (paddle_config['height'] / 2)
+        ball['vx'] = -ball['vx']
+        ball['vy'] = 600 * relative_hit
+
+    def handle_scoring(self):
+        ball_state = self.game_state['ball']
+        canvas = self.manager.config['canvas']
+        if ball_state['x'] < 0 or ball_state['x'] > canvas['width']:
+            self.game_state['paddles']['right' if ball_state['x'] < 0 else 'left']['score'] += 1
+            ball_state['x'] = canvas['width'] / 2
+            ball_state['y'] = canvas['height'] / 2
+
+
+def measure_room_memory(rooms, mode="PVP", baseline=False):
+    """
+    Bytes allocated per room state, measured with tracemalloc.
+    """
+    config = RoomConfig(CONFIG)
+    gc.collect()
+    tracemalloc.start()
+    if baseline:
+        states = [dict_room(index, mode) for index in range(rooms)]
+    else:
+        states = [make_room(index, config, mode) for index in range(rooms)]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated / len(states)
+
+
+def measure_dict_tick_cpu(rooms, ticks, mode="PVP"):
+    """
+    Microseconds of DictLoop.update_game_state() per room per tick.
+    """
+    loops = [DictLoop(dict_room(index, mode)) for index in range(rooms)]
+    dt = 1.0 / CONFIG['tick_rate']
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for loop in loops:
+            loop.update_game_state(dt)
+    return (time.perf_counter() - start) / ticks / rooms * 1e6
+
+
+def measure_tick_cpu(rooms, ticks, mode="PVP"):
+    """
+    Microseconds of update_game_state() per room per tick.
+    """
+    manager = StubManager()
+    config = RoomConfig(CONFIG)
+    loops = [GameLoop(f"bench-{index}", manager, make_room(index, config, mode)) for index in range(rooms)]
+    dt = 1.0 / CONFIG['tick_rate']
+
+    async def run():
+        start = time.perf_counter()
+        for _ in range(ticks):
+            for loop in loops:
+                await loop.update_game_state(dt)
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    return elapsed / ticks / rooms * 1e6
+
+
+def engines():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return ("python",)
+    return ("python", "numpy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--ticks', type=int, default=1000)
+    parser.add_argument('--baseline', action='store_true', help="Also measure rooms kept as dicts")
+    args = parser.parse_args()
+
+    print(f"room state: {measure_room_memory(args.rooms):.0f} bytes/room")
+    if args.baseline:
+        print(f"  as dicts: {measure_room_memory(args.rooms, baseline=True):.0f} bytes/room")
+    print(f"physics:    {measure_tick_cpu(args.rooms, args.ticks):.2f} us/room/tick")
+    if args.baseline:
+        print(f"  as dicts: {measure_dict_tick_cpu(args.rooms, args.ticks):.2f} us/room/tick")
+    for mode in MODES:
+        for engine in engines():
+            result = run_scenario(args.rooms, args.ticks, mode, config={'physics_engine': engine, 'ai_engine': engine})
+            print(format_result(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Single elimination brackets for tournaments of 2 to MAX_PLAYERS players.
+
+A bracket has `size` slots, the player count rounded up to a power of two,
+and size - 1 matches numbered like a binary heap: match 1 is the final and
+match m is fed by the winners of matches 2m and 2m + 1, so the first round
+is matches size // 2 to size - 1. Players are seeded in the order given,
+seed 1 against seed `size` and so on (see seeding()), which hands the byes
+to the first seeds and never pairs two byes.
+
+Every match is played in its own room, `<tournament_id>-<match>`, and can
+start as soon as both its players are known, so all matches of a round
+play at once. A result only touches its match and the one it feeds.
+
+The bracket depends on nothing but the tournament id and the player order,
+so matchmaking issues the first join tokens from its own copy (see
+MatchmakingManager._notify_players()) and every game server process builds
+the same one from the state in Redis, see tournaments.py.
+"""
+MAX_PLAYERS = 256
+
+
+def seeding(size):
+    """
+    Seeds in slot order, e.g. [1, 8, 4, 5, 2, 7, 3, 6] for 8 slots: slots
+    2k and 2k + 1 meet in the first round and the top seeds meet last.
+    """
+    order = [1]
+    while len(order) < size:
+        order = [seed for top in order for seed in (top, 2 * len(order) + 1 - top)]
+    return order
+
+
+class Match:
+    __slots__ = ('number', 'round', 'room_id', 'players', 'winner')
+
+    def __init__(self, number, round, room_id):
+        self.number = number
+        self.round = round  # 1 for the first round
+        self.room_id = room_id
+        self.players = [None, None]  # [left, right] user ids, None until decided
+        self.winner = None
+
+    @property
+    def ready(self):
+        return None not in self.players and self.winner is None
+
+    def to_dict(self):
+        return {
+            'match': self.number,
+            'round': self.round,
+            'room_id': self.room_id,
+            'players': self.players,
+            'winner': self.winner,
+        }
+
+
+class Bracket:
+    __slots__ = ('tournament_id', 'players', 'size', 'rounds', 'matches', 'rooms', 'current', 'winner')
+
+    def __init__(self, tournament_id, players):
+        players = [str(player) for player in players]
+        if not 2 <= len(players) <= MAX_PLAYERS:
+            raise ValueError(f"A tournament needs 2 to {MAX_PLAYERS} players, got {len(players)}")
+        if len(set(players)) != len(players):
+            raise ValueError(f"Tournament {tournament_id} lists a player twice")
+        self.tournament_id = tournament_id
+        self.players = players
+        self.size = size = 1 << (len(players) - 1).bit_length()
+        self.rounds = size.bit_length() - 1
+        self.matches = [None] + [
+            Match(number, self.rounds - number.bit_length() + 1, f"{tournament_id}-{number}")
+            for number in range(1, size)
+        ]
+        self.rooms = {match.room_id: match for match in self.matches[1:]}
+        self.current = {}  # {user_id: Match the player plays, or waits for, next}
+        self.winner = None
+
+        for slot, seed in enumerate(seeding(size)):
+            if seed <= len(players):
+                match = self.matches[(size + slot) // 2]
+                match.players[slot % 2] = players[seed - 1]
+                self.current[players[seed - 1]] = match
+        for match in self.matches[size // 2:]:
+            if match.players[1] is None:
+                # A bye, always on the right since the top seed is on the left
+                self.advance(match, match.players[0])
+
+    def ready(self):
+        """
+        Every match that can be played now.
+        """
+        return [match for match in self.matches[1:] if match.ready]
+
+    def first_match(self, user_id):
+        """
+        The match a player starts in: their first round match, or the
+        second round one after a bye.
+        """
+        return self.current[str(user_id)]
+
+    def record(self, room_id, winner):
+        """
+        Record the result of the match played in `room_id`. Returns the
+        match the winner goes on to, None if they won the tournament.
+        """
+        return self.advance(self.check(room_id, winner), str(winner))
+
+    def check(self, room_id, winner):
+        """
+        The match played in `room_id`, if `winner` can win it.
+        Raises ValueError otherwise.
+        """
+        match = self.rooms.get(room_id)
+        if match is None:
+            raise ValueError(f"Room {room_id} is not a match of tournament {self.tournament_id}")
+        if match.winner is not None:
+            raise ValueError(f"Match {match.number} of tournament {self.tournament_id} is already over")
+        if str(winner) not in match.players:
+            raise ValueError(f"{winner} does not play match {match.number} of tournament {self.tournament_id}")
+        return match
+
+    def catch_up(self, results):
+        """
+        Apply the results, {match number: winner}, this bracket does not
+        have yet. Feeding matches have higher numbers and go first.
+        """
+        for number in sorted(results, reverse=True):
+            match = self.matches[number]
+            if match.winner is None:
+                self.advance(match, results[number])
+
+    def advance(self, match, winner):
+        match.winner = winner
+        for player in match.players:
+            if player is not None and player != winner:
+                del self.current[player]
+        if match.number == 1:
+            self.winner = winner
+            del self.current[winner]
+            return None
+        next_match = self.matches[match.number // 2]
+        next_match.players[match.number % 2] = winner
+        self.current[winner] = next_match
+        return next_match
+
+    def to_dict(self):
+        return {
+            'tournament_id': self.tournament_id,
+            'players': self.players,
+            'rounds': self.rounds,
+            'matches': [match.to_dict() for match in self.matches[1:]],
+            'winner': self.winner,
+        }
@@ -0,0 +1,218 @@
+"""
+Room checkpoints in Redis, so live games survive a reload, a crash or a
+rolling deploy.
+
+A checkpoint is one line of JSON with what rebuilds the room (its
+attributes, seed and members) followed by the changing state packed with
+STATE, around 300 bytes per room. Each room has one key,
+game:checkpoint:<room_id>, that expires ttl seconds after its last write.
+
+CheckpointWriter snapshots rooms whose simulation moved on every interval,
+and rooms that scored right away. Snapshots are taken in the event loop
+between ticks and only pack a few numbers; all the Redis work of one round
+goes out as a single pipeline from a worker thread, so ticks never wait on
+Redis.
+
+When the first member of a room connects to a process that does not run
+it, GameManager resumes the room from its checkpoint (see restore()): the
+room waits for every player to be ready again, then counts down and goes
+on from where it was. Finished rooms delete their checkpoint.
+
+Draining (`python manage.py drain_games`) sets DRAIN_KEY. The next round of
+every older process checkpoints all its rooms, stops them and closes their
+sockets with DRAINING_CLOSE_CODE, which clients answer by reconnecting,
+and reports to DRAINED_KEY. Processes started after the request ignore it.
+
+Rooms running in game shards have no state in this process and are not
+checkpointed, see sharding.py.
+"""
+import logging, asyncio, json, os, socket, struct, time
+
+from apps.game.state import RoomConfig, RoomState, PlayerState, PLAYING, COUNTDOWN, SERVING, OVER
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "game:checkpoint:"
+DRAIN_KEY = "game:drain"  # Time the drain was requested
+DRAINED_KEY = "game:drained"  # {process: "<time> <rooms>"} written by drained processes
+DRAINING_CLOSE_CODE = 4503
+
+PHASES = (PLAYING, COUNTDOWN, SERVING, OVER)
+
+# step_count, tick_count, phase_ends, serves,
+# ball x, y, vx, vy, render, left y, right y,
+# left score, right score, left seq, right seq, phase, paused
+STATE = struct.Struct('<IIIHffff?ffBBHHB?')
+
+
+def snapshot(loop):
+    """
+    Encode a GameLoop's room as a checkpoint.
+    """
+    loop.pull_physics()
+    game_state = loop.game_state
+    ball, left, right = game_state.ball, game_state.left, game_state.right
+    header = {
+        'room_id': game_state.room_id,
+        'attributes': game_state.game_attributes,
+        'seed': game_state.seed,
+        'players': {user_id: [player.side, player.alias] for user_id, player in game_state.players.items()},
+        'spectators': list(game_state.spectators),
+        'time': time.time(),
+    }
+    state = STATE.pack(
+        loop.step_count, loop.tick_count, game_state.phase_ends, game_state.serves,
+        ball.x, ball.y, ball.vx, ball.vy, ball.render, left.y, right.y,
+        min(left.score, 255), min(right.score, 255), left.seq & 0xFFFF, right.seq & 0xFFFF,
+        PHASES.index(game_state.phase), game_state.paused,
+    )
+    return json.dumps(header, separators=(',', ':')).encode() + b'\n' + state
+
+
+def restore(config, data):
+    """
+    Rebuild a room from a checkpoint. Returns (RoomState, step_count,
+    tick_count). Nobody is ready and the game is not started, so the room
+    waits for its players to come back, see GameLoop.set_game_started().
+    """
+    line, state = data.split(b'\n', 1)
+    header = json.loads(line)
+    game_state = RoomState(RoomConfig(config), **dict(header['attributes'], seed=header['seed']))
+    for user_id, (side, alias) in header['players'].items():
+        player = PlayerState(user_id, side)
+        player.alias = alias
+        game_state.players[user_id] = player
+    for user_id in header['spectators']:
+        game_state.spectators[user_id] = PlayerState(user_id)
+
+    (
+        step_count, tick_count, game_state.phase_ends, game_state.serves,
+        ball_x, ball_y, ball_vx, ball_vy, render, left_y, right_y,
+        left_score, right_score, left_seq, right_seq, phase, game_state.paused,
+    ) = STATE.unpack(state)
+    ball = game_state.ball
+    ball.x, ball.y, ball.vx, ball.vy, ball.render = ball_x, ball_y, ball_vx, ball_vy, render
+    game_state.left.y, game_state.left.score, game_state.left.seq = left_y, left_score, left_seq
+    game_state.right.y, game_state.right.score, game_state.right.seq = right_y, right_score, right_seq
+    game_state.phase = PHASES[phase]
+    return game_state, step_count, tick_count
+
+
+class CheckpointWriter:
+    def __init__(self, manager, redis_client, interval=1.0, ttl=300):
+        self.manager = manager
+        self.redis = redis_client
+        self.interval = interval  # Seconds between rounds
+        self.ttl = ttl  # Seconds a checkpoint outlives its last write
+        self.dirty = set()  # Rooms to checkpoint in the next round whatever their step
+        self.deleted = set()  # Rooms whose checkpoint goes in the next round
+        self.steps = {}  # {room_id: step_count of the last checkpoint}
+        self.started_at = time.time()
+        self.process = f"{socket.gethostname()}:{os.getpid()}"
+        self.writes = 0
+        self.bytes = 0
+        self.resumed = 0
+        self.writing = False
+        self.round_soon = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            logger.info(f"Checkpoint writer started, every {self.interval} s")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.write_round(check_drain=True)
+
+    def mark(self, room_id):
+        """
+        Checkpoint a room in a round that runs as soon as the current tick
+        is done, e.g. after a goal.
+        """
+        self.dirty.add(room_id)
+        if self.round_soon is None:
+            self.round_soon = asyncio.create_task(self.write_round())
+
+    def discard(self, room_id):
+        """
+        Delete a room's checkpoint in the next round, e.g. once it is finished.
+        """
+        self.dirty.discard(room_id)
+        self.steps.pop(room_id, None)
+        self.deleted.add(room_id)
+
+    def collect(self, everything=False):
+        """
+        Snapshot every local room that moved since its last checkpoint, or
+        every one with `everything`. Rooms that never stepped have nothing
+        to resume, and rooms running in shards have no state here; both are
+        skipped.
+        """
+        snapshots = {}
+        for room_id, loop in list(self.manager.loops.items()):
+            if not getattr(loop, 'step_count', 0) or room_id in self.deleted:
+                continue  # In a shard, not started yet or going away
+            if everything or room_id in self.dirty or self.steps.get(room_id) != loop.step_count:
+                snapshots[room_id] = snapshot(loop)
+                self.steps[room_id] = loop.step_count
+        self.dirty.clear()
+        return snapshots
+
+    async def write_round(self, check_drain=False, everything=False):
+        self.round_soon = None
+        if self.writing:
+            return  # The next round picks up what is marked
+        self.writing = True
+        try:
+            snapshots = self.collect(everything)
+            deleted, self.deleted = self.deleted, set()
+            if not snapshots and not deleted and not check_drain:
+                return
+            results = await asyncio.to_thread(self.execute, snapshots, deleted, check_drain)
+            self.writes += len(snapshots)
+            self.bytes += sum(len(data) for data in snapshots.values())
+        except Exception as e:
+            logger.error(f"Could not write room checkpoints: {e}")
+            return
+        finally:
+            self.writing = False
+        if check_drain and results[-1] and float(results[-1]) > self.started_at and not self.manager.draining:
+            await self.manager.drain()
+
+    async def write_all(self):
+        """
+        Checkpoint every local room now, after any round in flight.
+        """
+        while self.writing:
+            await asyncio.sleep(0.01)
+        await self.write_round(everything=True)
+
+    def execute(self, snapshots, deleted, check_drain):
+        """
+        One pipeline for a whole round. Runs in a worker thread.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for room_id, data in snapshots.items():
+            pipe.set(KEY_PREFIX + str(room_id), data, ex=self.ttl)
+        for room_id in deleted:
+            pipe.delete(KEY_PREFIX + str(room_id))
+        if check_drain:
+            pipe.get(DRAIN_KEY)
+        return pipe.execute()
+
+    async def load(self, room_id):
+        """
+        The room's checkpoint, or None.
+        """
+        try:
+            return await asyncio.to_thread(self.redis.get, KEY_PREFIX + str(room_id))
+        except Exception as e:
+            logger.error(f"Could not load checkpoint of room {room_id}: {e}")
+            return None
+
+    async def drained(self, rooms):
+        await asyncio.to_thread(self.redis.hset, DRAINED_KEY, self.process, f"{time.time()} {rooms}")
+
+    def stats(self):
+        return {'writes': self.writes, 'bytes': self.bytes, 'resumed': self.resumed}
@@ -1,6 +1,8 @@
 # backend/apps/game/consumers.py
 from time import timezone
 from .manager import game_manager
+from .game_loop import player_group, spectator_group
+from .checkpoint import DRAINING_CLOSE_CODE
 
 from asgiref.sync import async_to_sync
 import os
@@ -18,6 +20,7 @@ SECRET_KEY = settings.SECRET_KEY
 class GameConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         logger.info("GameConsumer().connect() called.")
+        game_manager.start()
         # Parse the token from the query string
         query_string = self.scope['query_string'].decode()
         query_params = parse_qs(query_string)
@@ -28,6 +31,12 @@ class GameConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
+        if game_manager.draining:
+            # Rooms resume elsewhere, tell the client to come back (see checkpoint.py)
+            await self.accept()
+            await self.close(code=DRAINING_CLOSE_CODE)
+            return
+
         try:
             # Decode the JWT token
             self.game_attributes = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
@@ -45,24 +54,44 @@ class GameConsumer(AsyncWebsocketConsumer):
             players = self.game_attributes.get("users")
             tournament_id = self.game_attributes.get("tournament_id")
             logger.info("Consumer.Connect() before tournament check")
-            if tournament_id and game_manager.tournament_manager.tournaments.get(tournament_id) == None:
-                await game_manager.tournament_manager.add(tournament_id, players)
-                start_players = await game_manager.tournament_manager.advance_next_match(tournament_id)
-                logger.info(f"Start players: {start_players}")
+            if tournament_id:
+                # Creates the tournament on its first connection on any process,
+                # or catches up with results recorded elsewhere, see tournaments.py
+                await game_manager.tournament_manager.load(tournament_id, players)
             logger.info("Consumer.Connect() after tournament check")
 
             user_id = self.game_attributes.get("user_id")
             async_to_sync(game_manager.add_player_to_channel_map(user_id, self.channel_name))
 
-            # Generate group name dynamically
-            self.room_group_name = f"game_{self.game_attributes['room_id']}"
+            # Generate group name dynamically. Tournament spectators get their
+            # own group with a lower frame rate, see GameLoop.broadcast_spectator_state
+            room_id = self.game_attributes['room_id']
+            if game_manager.is_spectator(**self.game_attributes):
+                self.room_group_name = spectator_group(room_id)
+            else:
+                self.room_group_name = player_group(room_id)
+
+            # The room may run on another node, which then gets our events and
+            # sends us its frames through the channel layer, see registry.py
+            owner = await game_manager.registry.owner(room_id)
+            if not game_manager.registry.is_local(owner):
+                await self.accept()
+                await game_manager.registry.join(self, owner)
+                return
 			
-            # Add player to the group
-            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-            await self.accept()
-
-            # Add player to the room via GameManager
-            await game_manager.add_player(**self.game_attributes)
+            # Add player to the group. The room runs in this process, so the
+            # manager delivers its frames in memory, see local_layer.py
+            try:
+                await game_manager.channel_layer.group_add(self.room_group_name, self.channel_name, consumer=self)
+                await self.accept()
+
+                # Add player to the room via GameManager
+                await game_manager.add_player(**self.game_attributes)
+            except Exception:
+                # Do not hold a room that never started here until its lease runs out
+                if room_id not in game_manager.games:
+                    await game_manager.registry.release([room_id])
+                raise
 
             # # # Start the game manager if it's not running
             # if not game_manager.running:
@@ -79,10 +108,14 @@ class GameConsumer(AsyncWebsocketConsumer):
             await self.close()
 
     async def disconnect(self, close_code):
+        if not hasattr(self, 'room_group_name'):
+            return  # Closed before joining a room
         logger.debug(f"WebSocket disconnect: room={self.game_attributes['room_id']}, channel={self.channel_name}, close_code={close_code}")
-        await game_manager.remove_player(self.game_attributes['room_id'], self.channel_name)
+        if await game_manager.registry.leave(self):
+            return  # The owner removes the player
+        await game_manager.remove_player(self.game_attributes['room_id'], self.game_attributes['user_id'])
         try:
-            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await game_manager.channel_layer.group_discard(self.room_group_name, self.channel_name)
         except Exception as e:
             logger.error(f"Error during disconnect: {e}")
 
@@ -101,7 +134,15 @@ class GameConsumer(AsyncWebsocketConsumer):
         elif action == 'input':
             up = data.get('up', False)
             down = data.get('down', False)
-            await game_manager.update_player_input(room_id, user_id, up, down)
+            seq = data.get('seq')
+            if not isinstance(seq, int) or isinstance(seq, bool):
+                seq = None
+            # `time` is when the key was pressed on the clock of the room's
+            # node, see clock_sync below
+            sent = data.get('time')
+            if not isinstance(sent, int) or isinstance(sent, bool):
+                sent = None
+            await game_manager.update_player_input(room_id, user_id, up, down, seq, sent)
 
         elif action == 'player_ready':
             logger.info("Received 'player_ready'")
@@ -115,8 +156,17 @@ class GameConsumer(AsyncWebsocketConsumer):
             logger.debug(f"Resuming game for room: {room_id}")
             await game_manager.set_game_resumed(room_id)
 
+        elif action == 'clock_sync':
+            # Answered by the node running the room, whose clock stamps the
+            # server_time of its frames
+            await game_manager.clock_sync(room_id, self.channel_name, data.get('client_time'))
+
     
     async def game_message(self, event):
     
-        # Called by group_send in GameManager
-        await self.send(text_data=json.dumps(event['data']))
\ No newline at end of file
+        # Called by group_send in GameManager, already JSON, see protocol.game_message
+        await self.send(text_data=event['text'])
+
+    async def game_frame(self, event):
+        # Binary state frame from GameLoop.broadcast_state, see protocol.py
+        await self.send(bytes_data=event['frame'])
\ No newline at end of file
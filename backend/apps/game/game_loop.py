@@ -1,71 +1,290 @@
-import logging, asyncio, time, random
+import logging, asyncio, os, time
+from apps.game.input_log import InputLog, replay_header, write_replay, prune_replays
+from apps.game.lag import LagCompensator
+from apps.game.mailbox import Mailbox
+from apps.game.protocol import FrameEncoder, game_message
+from apps.game.state import PLAYING, COUNTDOWN, SERVING, OVER
+from apps.game.watchdog import TickBudget, REDUCED_BROADCAST, REDUCED_AI, DEGRADED
 logger = logging.getLogger(__name__)
 
 
+def player_group(room_id):
+    return f"game_{room_id}"
+
+
+def spectator_group(room_id):
+    return f"game_{room_id}_spectators"
+
+
 class GameLoop:
     def __init__(self, room_id, manager, initial_game_state):
         self.room_id = room_id
         self.manager = manager
-        self.queue = asyncio.Queue()
-        self.game_state = initial_game_state
+        self.game_state = initial_game_state  # RoomState
+        self.config = initial_game_state.config  # RoomConfig
+        self.mailbox = Mailbox(wake=self.wake)
+        self.encoder = FrameEncoder(self.config, keyframe_interval=self.config.send_rate)
+        # Physics runs every tick, frames go out every send_interval ticks
+        self.base_send_interval = max(1, round(self.config.tick_rate / self.config.send_rate))
+        self.send_interval = self.base_send_interval
+        # Spectators get their own group, rate and delta chain
+        self.spectator_encoder = FrameEncoder(
+            self.config,
+            keyframe_interval=1 if self.config.spectator_keyframes_only else self.config.spectator_send_rate,
+        )
+        self.base_spectator_interval = max(1, round(self.config.tick_rate / self.config.spectator_send_rate))
+        self.spectator_interval = self.base_spectator_interval
+        self.next_spectator_frame = 0
+        self.ai_interval = 1  # Ticks between AI re-predictions
+        self.budget = TickBudget(room_id, self.config.tick_budget, window=max(1, self.config.tick_rate // 2))
+        self.tick_work = 0.0  # Seconds spent on this room in the current tick
+        self.errors = 0
+        self.tick_count = 0
+        self.step_count = 0  # Ticks the simulation actually stepped
+        self.input_log = InputLog(record=bool(manager.config.get('replay_dir')))
+        self.lag = LagCompensator(self.config.max_rewind)  # Recent positions, see lag.py
         self.running = False
-        
-        
+        self.parked = False  # Off the scheduler until an event arrives
+        self.resumed = False  # Rebuilt from a checkpoint, see checkpoint.py
+        # Set while the batched engine holds the ball and paddles, see batch_physics.py
+        self.physics = None
+        self.physics_row = None
+        self.physics_dirty = False
+        self.physics_synced = 0
+
     async def start(self):
         """
-        Main loop that processes events and updates the game state.
+        Register the loop with the manager's shared tick scheduler.
         """
         self.running = True
+        self.manager.scheduler.register(self)
         logger.info(f"Game loop started for room {self.room_id}")
-        
-        # Main game loop
-        # Update game state
-        dt = 1.0 / 60  # Assume 60 FPS
-        while self.running:
-            try:
-                # Sleep until next tick
-                await asyncio.sleep(dt)
-                # Process events from the queue
-                try:
-                    event = self.queue.get_nowait()
-                    await self.handle_event(event)
-                except asyncio.QueueEmpty:
-                    
-                    pass
-
-                if not self.game_state.get('game_started') or self.game_state.get('paused'):
-                    continue
-
-                await self.update_game_state(dt)
-
-                # Broadcast game state periodically
-                await self.broadcast_state()
-
-            except Exception as e:
-                logger.error(f"Error in game loop for room {self.room_id}: {e}")
-
-    async def stop(self):
+
+    async def tick(self, dt):
+        """
+        Process events and update the game state for one timestep.
+        Called by the TickScheduler.
+        """
+        if not await self.begin_tick():
+            return
+        try:
+            start = time.perf_counter()
+            await self.update_game_state(dt)
+            self.tick_work += time.perf_counter() - start
+            await self.end_tick()
+        except Exception as e:
+            self.log_error("Error in game loop", e)
+
+    async def simulate(self, dt):
+        """
+        Step the physics and scoring of this room but not its AI paddle,
+        which the scheduler moves for every room at once, see ai.py.
+        """
+        try:
+            start = time.perf_counter()
+            await self.update_game_state(dt, ai=False)
+            self.tick_work += time.perf_counter() - start
+        except Exception as e:
+            self.log_error("Error in game loop", e)
+
+    async def batch_tick(self, scoring_side):
+        """
+        Finish a step after the batched physics engine has already moved the
+        ball and paddles of this room: score its goal, if any. Mirrors the
+        rest of update_game_state().
+        """
+        if not scoring_side:
+            return
+        try:
+            start = time.perf_counter()
+            self.touch_physics()
+            await self.score_goal(scoring_side)
+            self.tick_work += time.perf_counter() - start
+        except Exception as e:
+            self.log_error("Error in game loop", e)
+
+    async def finish_tick(self):
+        try:
+            await self.end_tick()
+        except Exception as e:
+            self.log_error("Error in game loop", e)
+
+    async def begin_tick(self):
+        """
+        Apply every event that arrived since the last tick.
+        Returns True if the simulation should step this tick.
+        """
+        if not self.running:
+            return False
+        start = time.perf_counter()
+        self.tick_count += 1
+        try:
+            if self.mailbox.pending:
+                self.touch_physics()
+            for event in self.mailbox.drain():
+                await self.handle_event(event)
+        except Exception as e:
+            self.log_error("Error handling events", e)
+        self.tick_work = time.perf_counter() - start
+        game_state = self.game_state
+        if self.running and game_state.game_started and not game_state.paused and game_state.phase != OVER:
+            self.step_count += 1
+            self.advance_phase()
+            return True
+        if self.running and not self.mailbox.pending:
+            # Nothing to simulate until the next event, see wake()
+            self.parked = True
+            self.manager.scheduler.park(self)
+        return False
+
+    def pull_physics(self):
+        """
+        Bring the ball and paddles of game_state up to date before reading
+        them, if the batched engine holds them.
+        """
+        physics = self.physics
+        if physics is not None and not self.physics_dirty and self.physics_synced != physics.generation:
+            physics.sync_out(self)
+
+    def touch_physics(self):
+        """
+        Call before changing the ball, the paddles or the players outside
+        the batched engine, which then reloads them before its next step.
+        """
+        physics = self.physics
+        if physics is not None and not self.physics_dirty:
+            self.pull_physics()
+            self.physics_dirty = True
+            physics.dirty.append(self)
+
+    def wake(self):
+        """
+        Put a parked loop back on the tick. Called by the mailbox when an
+        event arrives.
+        """
+        if self.parked and self.running:
+            self.parked = False
+            self.manager.scheduler.register(self)
+
+    def start_countdown(self):
+        """
+        Hide the ball for the configured countdown before the first serve.
+        Logged, since when the game starts depends on the players.
+        """
+        if self.config.countdown:
+            self.game_state.ball.render = False
+            self.start_phase(COUNTDOWN, self.config.countdown)
+            self.input_log.countdown(self.step_count)
+
+    def start_phase(self, phase, steps):
+        self.game_state.phase = phase
+        self.game_state.phase_ends = self.step_count + steps
+
+    def advance_phase(self):
+        """
+        Serve once a countdown or serve delay has run out. Called at the start
+        of every simulation step, so the delays are counted in steps rather
+        than slept, and freeze while the game is paused.
+        """
+        game_state = self.game_state
+        if game_state.phase in (COUNTDOWN, SERVING) and self.step_count >= game_state.phase_ends:
+            self.touch_physics()
+            game_state.ball.render = True
+            game_state.phase = PLAYING
+
+    async def end_tick(self):
+        # Check the tick against the room's budget. While the scheduler is
+        # behind its deadlines every room counts as over, since all were late.
+        if self.budget.record(self.tick_work, self.manager.scheduler.behind):
+            self.apply_budget_level()
+        self.tick_work = 0.0
+
+        # Broadcast game state at the send rate. The final state of a game
+        # goes out right away, since the room stops stepping after it.
+        if self.tick_count % self.send_interval == 0 or self.game_state.phase == OVER:
+            await self.broadcast_state()
+        elif self.spectator_frame_due():
+            await self.broadcast_spectator_state()
+
+    def spectator_frame_due(self):
+        """
+        Players come first: a spectator frame waits for a tick without a
+        player frame that also stayed within the room's budget.
+        """
+        if not self.game_state.spectators or self.tick_count < self.next_spectator_frame:
+            return False
+        return self.budget.last_duration <= self.budget.budget and not self.manager.scheduler.behind
+
+    def apply_budget_level(self):
+        """
+        Apply the watchdog's current level. Each level keeps the ones below it:
+        half the player and a quarter of the spectator broadcast rate, then
+        fewer AI re-predictions, then the room is flagged as degraded in its
+        frames.
+        """
+        level = self.budget.level
+        self.send_interval = self.base_send_interval * (2 if level >= REDUCED_BROADCAST else 1)
+        self.spectator_interval = self.base_spectator_interval * (4 if level >= REDUCED_BROADCAST else 1)
+        ai_interval = max(1, self.config.tick_rate // 10) if level >= REDUCED_AI else 1
+        if ai_interval != self.ai_interval:
+            self.touch_physics()  # The batched AI keeps the interval in its rows
+            self.ai_interval = ai_interval
+            self.input_log.ai_interval(self.step_count, level >= REDUCED_AI)
+        self.game_state.degraded = level >= DEGRADED
+
+    def log_error(self, context, e):
+        """
+        Log the first error and every 100th after it, so a room that fails
+        every tick does not flood the log.
+        """
+        self.errors += 1
+        if self.errors == 1 or self.errors % 100 == 0:
+            logger.error(f"{context} for room {self.room_id} ({self.errors} errors so far): {e}")
+
+    async def stop(self, replay=True):
+        was_running = self.running
         self.running = False
-        logger.info(f"Game loop stopped for room {self.room_id}")
+        self.manager.scheduler.unregister(self.room_id)
+        logger.info(f"Game loop stopped for room {self.room_id}, mailbox: {self.mailbox.stats()}, ticks: {self.budget.stats()}")
+        # The input log of a resumed room starts mid-match and cannot be replayed
+        if was_running and self.step_count and replay and not self.resumed:
+            await self.save_replay()
+
+    async def save_replay(self):
+        """
+        Write the match's input log to the configured replay_dir, if any.
+        See input_log.py and replay.py.
+        """
+        replay_dir = self.manager.config.get('replay_dir')
+        if not replay_dir:
+            return
+        path = os.path.join(replay_dir, f"{self.room_id}-{self.game_state.seed}.replay")
+        try:
+            await asyncio.to_thread(write_replay, path, replay_header(self), self.input_log)
+            logger.info(f"Saved replay of room {self.room_id} to {path} ({len(self.input_log)} entries)")
+            pruned = await asyncio.to_thread(prune_replays, replay_dir, self.manager.config.get('replay_keep', 1000))
+            if pruned:
+                logger.info(f"Deleted {pruned} old replays from {replay_dir}")
+        except OSError as e:
+            logger.error(f"Could not save replay of room {self.room_id}: {e}")
 
     async def handle_event(self, event):
         """
         Handle events sent from the GameManager (e.g., player input, pause, resume).
         """
-        logger.info(f"Process event: {event}")
         event_type = event["type"]
         if event_type == "player_input":
             user_id = event["user_id"]
             input_data = event["input"]
-            self.update_player_input(user_id, input_data)
+            self.update_player_input(user_id, input_data, event.get("seq"), event.get("delay"))
         elif event_type == "set_game_started":
             logger.info(f"Select event: {event_type}")
             user_id = event["user_id"]
             self.set_game_started(user_id)
         elif event_type == "pause":
-            self.game_state["paused"] = True
+            self.game_state.paused = True
         elif event_type == "resume":
-            self.game_state["paused"] = False
+            self.game_state.paused = False
         elif event_type == "stop":
             await self.stop()
         # Handle other events as needed
@@ -81,337 +300,383 @@ class GameLoop:
             logger.warning(f"Game not found for room {self.room_id}")
             return
     
-        if user_id in game['players']:
-            game['players'][user_id]['ready'] = True
-        if user_id in game['spectators']:
-            game['spectators'][user_id]['ready'] = True
+        if user_id in game.players:
+            game.players[user_id].ready = True
+        if user_id in game.spectators:
+            game.spectators[user_id].ready = True
     
-        # Check if all players and spectators are ready
-        players = list(game['players'].values())
-        spectators = list(game['spectators'].values())
-        total_players = len(players) + len(spectators)
-        all_players_ready = all(p.get('ready', False) for p in players)
-        all_spectators_ready = all(s.get('ready', False) for s in spectators)
+        # Check if the match is complete and everyone in the room is ready.
+        # Spectators of a tournament match are not counted in room_size.
+        players = list(game.players.values())
+        spectators = list(game.spectators.values())
+        total_players = len(players)
+        all_players_ready = all(p.ready for p in players)
+        all_spectators_ready = all(s.ready for s in spectators)
     
-        logger.info(f"Players in room {self.room_id}: {players}")
+        logger.info(f"Players in room {self.room_id}: {[p.to_dict() for p in players]}")
         logger.info(f"Total players (num): {total_players}, all_players_ready: {all_players_ready}, all_spectators_ready: {all_spectators_ready}")
     
-        if total_players == game['room_size'] and all_players_ready and all_spectators_ready:
-            game['game_started'] = True
+        if total_players == game.room_size and all_players_ready and all_spectators_ready:
+            if not game.game_started:
+                game.game_started = True
+                self.start_countdown()
             logger.info(f"Game in room '{self.room_id}' has started.")
         else:
             logger.info(f"Waiting for all players and spectators to be ready in room {self.room_id}...")
 
-    async def update_game_state(self, dt):
-        if self.game_state['ball']['render']:
-            self.update_ball_position(dt)
-            self.handle_ball_collisions()
+    async def update_game_state(self, dt, ai=True):
+        if self.game_state.ball.render:
+            if self.config.collision_mode == 'swept':
+                self.sweep_ball(dt)
+            else:
+                self.update_ball_position(dt)
+                self.handle_ball_collisions()
             await self.handle_scoring()
     
         self.update_paddles(dt)
-        if self.game_state['ai']['active']:
+        # Before the AI, like the batched engine, which records its rows
+        # before AIController.step()
+        self.lag.record(self.step_count, self.game_state)
+        if ai and self.game_state.ai.active:
             self.update_ai_paddle(dt)
 
     async def broadcast_state(self):
         """
-        Broadcast the game state to all players in the room.
+        Broadcast the game state to all players in the room as a binary frame.
         """
+        await self.send_frame(player_group(self.room_id), self.encoder)
+
+    async def broadcast_spectator_state(self):
+        """
+        Broadcast the game state to the room's spectators, at their own rate.
+        """
+        self.next_spectator_frame = self.tick_count + self.spectator_interval
+        await self.send_frame(spectator_group(self.room_id), self.spectator_encoder)
+
+    async def send_frame(self, group, encoder):
+        """
+        Send the next frame of `encoder` to `group`. Player aliases go out as
+        a separate JSON message when they change.
+        """
+        self.pull_physics()
+        players = encoder.players_changed(self.game_state)
+        if players:
+            await self.manager.channel_layer.group_send(
+                group,
+                game_message({'type': 'players', 'players': players}),
+            )
 
-        # Normalize the game state before sending
-        message = self.game_state.copy()
-        message.update(self.normalize_state())
-        
-        # logger.info(f"Sending ball: {message.get('ball')}")
-        # logger.info(f"Sending player paddle: {self.game_state.get('paddles').get('left')}")
-        
         await self.manager.channel_layer.group_send(
-            f"game_{self.room_id}",
+            group,
             {
-                'type': 'game_message',
-                'data': message,
+                'type': 'game_frame',
+                'frame': encoder.encode(self.game_state, self.tick_count),
             }
         )
 
-    def update_player_input(self, user_id, input_data):
+    def update_player_input(self, user_id, input_data, seq=None, delay=None):
         """
-        Update a player's input in the game state.
+        Update a player's input in the game state. `seq` is the client's
+        input sequence number, echoed back in frames for prediction, and
+        `delay` the milliseconds since the player pressed, see lag.py.
         """
-        if user_id in self.game_state["players"]:
-            self.game_state["players"][user_id]["input"] = input_data
+        player = self.game_state.players.get(user_id)
+        if player:
+            player.up = input_data['up']
+            player.down = input_data['down']
+            if seq is not None:
+                self.game_state.paddle(player.side).seq = seq
+            rewind = 0
+            if delay:
+                rewind = self.lag.rewind_steps(self.step_count, player.side, round(delay * self.config.tick_rate / 1000))
+            if self.input_log.input(self.step_count, player.side, player.up, player.down, rewind):
+                self.lag.apply(self, player, rewind)
 
     def update_paddles(self, dt):
-        paddle_speed = 550 * dt
-        canvas_height = self.manager.config['canvas']['height']
-        paddle_height = self.manager.config['paddle']['height']
+        paddle_speed = self.config.paddle_speed * dt
+        max_paddle_y = self.config.max_paddle_y
 
-        for player_data in self.game_state['players'].values():
-            input_data = player_data['input']
-            paddle = self.game_state['paddles'][player_data['side']]
+        for player in self.game_state.players.values():
+            paddle = self.game_state.paddle(player.side)
 
-            if input_data['up']:
-                paddle['y'] -= paddle_speed
-            if input_data['down']:
-                paddle['y'] += paddle_speed
+            if player.up:
+                paddle.y -= paddle_speed
+            if player.down:
+                paddle.y += paddle_speed
 
             # Clamp paddle movement to stay within the canvas
-            max_paddle_y = canvas_height - paddle_height
-            paddle['y'] = max(0, min(paddle['y'], max_paddle_y))
+            paddle.y = max(0, min(paddle.y, max_paddle_y))
 
     def update_ai_paddle(self, dt):
+        """
+        Move the AI paddle of this room alone. The scheduler normally does
+        this for every room at once, see ai.py; this is the reference it
+        matches, used by replays.
+        """
+        self.update_ai_target()
         game_state = self.game_state
-        ai_speed = 550 * dt
-        ball = self.game_state['ball']
-        paddle_height = self.manager.config['paddle']['height']
-        canvas_height = self.manager.config['canvas']['height']
-        ai_player = game_state['player_ai']
-
-        if not ai_player:
-            logger.error("AI player not found in game_state.")
-            return
-    
-        right_paddle = game_state['paddles']['right']
-        paddle_center = right_paddle['y'] + paddle_height / 2
-        
-        current_time = time.perf_counter()
-        ai = game_state['ai']
-        if not ai['since_last_update']:
-            ai['since_last_update'] = 0
-            ai['predicted_y'] = ball['y'] 
-        
-        elif current_time - ai['since_last_update'] >= 1:
-            ai['since_last_update'] = current_time
-            ai['predicted_y'] = self.predict_ball_position(ball, canvas_height, right_paddle['x'])
-        
-        predicted_y = ai['predicted_y']
+        config = self.config
+        ai = game_state.ai
+        ai_speed = config.paddle_speed * ai.profile.speed * dt
 
-        ai_input = ai_player['input']
-        ai_input['up'] = False
-        ai_input['down'] = False
+        right_paddle = game_state.right
+        paddle_center = right_paddle.y + config.paddle_height / 2
+        predicted_y = ai.predicted_y
 
-        if abs(paddle_center - predicted_y) > 15:
+        ai.up = False
+        ai.down = False
+
+        if predicted_y is not None and abs(paddle_center - predicted_y) > 15:
             if paddle_center < predicted_y:
-                ai_input['down'] = True
-                right_paddle['y'] += ai_speed
+                ai.down = True
+                right_paddle.y += ai_speed
             elif paddle_center > predicted_y:
-                ai_input['up'] = True
-                right_paddle['y'] -= ai_speed
+                ai.up = True
+                right_paddle.y -= ai_speed
         
         # Clamp AI paddle movement to stay within the canvas
-        max_paddle_y = canvas_height - paddle_height
-        right_paddle['y'] = max(0, min(right_paddle['y'], max_paddle_y))
+        right_paddle.y = max(0, min(right_paddle.y, config.max_paddle_y))
 
-    def predict_ball_position(self, ball, canvas_height, paddle_x):
-        predicted_y = ball['y']
-        ball_x = ball['x']
-        velocity_y = ball['vy']
-        velocity_x = ball['vx']
+    def update_ai_target(self):
+        """
+        Only predict again when the ball's velocity changed (bounce, hit or
+        reset), and under load only every ai_interval steps. The paddle keeps
+        going for its old target for the profile's reaction time.
+        """
+        game_state = self.game_state
+        ball = game_state.ball
+        ai = game_state.ai
+        trajectory = (ball.vx, ball.vy)
+        if ai.trajectory != trajectory and self.step_count % self.ai_interval == 0:
+            ai.trajectory = trajectory
+            predicted_y = self.predict_ball_position(ball, self.config.canvas_height, game_state.right.x)
+            ai.next_y = self.add_prediction_error(predicted_y)
+            ai.react_at = self.step_count + ai.reaction_steps
+        if ai.react_at is not None and self.step_count >= ai.react_at:
+            ai.predicted_y = ai.next_y
+            ai.react_at = None
 
-        if velocity_x <= 0:  # Ball moving left, AI doesn't need to predict
+    def predict_ball_position(self, ball, canvas_height, paddle_x):
+        """
+        Y where the ball will reach paddle_x, in O(1). The straight-line path
+        is unfolded across the walls and folded back into the band the ball
+        center can reach, [radius, canvas_height - radius].
+        """
+        if ball.vx <= 0:  # Ball moving left, AI doesn't need to predict
             return canvas_height / 2
         
-        if velocity_y == 0:  # Prevent division by zero
-            return predicted_y
-
-        iterations = 0  # Prevent infinite loop
-        max_iterations = 50
-
-        while iterations < max_iterations:
-            if ball_x >= paddle_x:
-                break
-
-            # Time to reach the next wall (top or bottom)
-            if velocity_y > 0:
-                time_to_wall = (canvas_height - predicted_y) / velocity_y
-            else:
-                time_to_wall = -predicted_y / velocity_y
-
-            # Time to reach the paddle
-            time_to_paddle = (paddle_x - ball_x) / velocity_x if velocity_x > 0 else float('inf')
-
-            # Take the minimum valid time step
-            time_step = min(time_to_wall, time_to_paddle)
-
-            if time_step < 0:
-                break
-
-            # Advance the ball position
-            ball_x += velocity_x * time_step
-            predicted_y += velocity_y * time_step
-
-            # Handle wall bounces
-            if predicted_y <= 0 or predicted_y >= canvas_height:
-                velocity_y = -velocity_y  # Reflect vertical direction
-                predicted_y = max(0, min(predicted_y, canvas_height))  # Keep within bounds
-
-            iterations += 1
-
-        if random.random() > 0.4:
-            offset = random.uniform(-100, 100)  # Add a slight error to prediction
-            predicted_y += offset
-   
+        if ball.vy == 0:
+            return ball.y
+
+        radius = self.config.ball_radius
+        band = canvas_height - 2 * radius
+        time_to_paddle = max(0.0, (paddle_x - ball.x) / ball.vx)
+        unfolded = ball.y - radius + ball.vy * time_to_paddle
+        folded = unfolded % (2 * band)
+        if folded > band:
+            folded = 2 * band - folded
+        return folded + radius
+
+    def add_prediction_error(self, predicted_y):
+        """
+        Seeded error so the AI can miss, drawn from the room's AI rng.
+        """
+        ai = self.game_state.ai
+        profile = ai.profile
+        if ai.rng.random() > 1 - profile.error_chance:
+            predicted_y += ai.rng.uniform(-profile.error_spread, profile.error_spread)
         return predicted_y
     
     def update_ball_position(self, dt):
-        ball_state = self.game_state['ball']
-        ball_state['x'] += ball_state['vx'] * dt
-        ball_state['y'] += ball_state['vy'] * dt
+        ball = self.game_state.ball
+        ball.x += ball.vx * dt
+        ball.y += ball.vy * dt
 
     def handle_ball_collisions(self):
-        canvas = self.manager.config['canvas']
-        ball_config = self.manager.config['ball']
-        paddle_config = self.manager.config['paddle']
-        ball_state = self.game_state['ball']
-        left_paddle = self.game_state['paddles']['left']
-        right_paddle = self.game_state['paddles']['right']
-        ball_radius = self.manager.config['ball']['diameter'] / 2
-        speedup_factor = 1.05
+        config = self.config
+        ball = self.game_state.ball
+        ball_radius = config.ball_radius
+        speedup_factor = config.speedup_factor
 
         # Check wall collisions
-        if (ball_state['vy'] > 0):
-            if ball_state['y'] + ball_radius >= canvas['height']:
-                ball_state['vy'] = -ball_state['vy'] * speedup_factor
-                ball_state['vx'] *= speedup_factor
-        if (ball_state['vy'] < 0):
-            if ball_state['y'] - ball_radius <= 0 :
-                ball_state['vy'] = -ball_state['vy'] * speedup_factor
-                ball_state['vx'] *= speedup_factor
+        if (ball.vy > 0):
+            if ball.y + ball_radius >= config.canvas_height:
+                ball.vy = -ball.vy * speedup_factor
+                ball.vx *= speedup_factor
+        if (ball.vy < 0):
+            if ball.y - ball_radius <= 0 :
+                ball.vy = -ball.vy * speedup_factor
+                ball.vx *= speedup_factor
         # Check for collision with the left paddle only if the ball is moving left
-        if ball_state['vx'] < 0:
-            if self.check_paddle_collision(ball_state, ball_config, left_paddle, paddle_config):
-                self.reflect_ball(ball_state, left_paddle, paddle_config)
-                ball_state['vx'] *= speedup_factor
-                ball_state['vy'] *= speedup_factor
+        if ball.vx < 0:
+            left_paddle = self.game_state.left
+            if self.check_paddle_collision(ball, left_paddle):
+                self.reflect_ball(ball, left_paddle)
+                ball.vx *= speedup_factor
+                ball.vy *= speedup_factor
         # Check for collision with the right paddle only if the ball is moving right
-        if ball_state['vx'] > 0:
-            if self.check_paddle_collision(ball_state, ball_config, right_paddle, paddle_config):
-                self.reflect_ball(ball_state, right_paddle, paddle_config)
-                ball_state['vx'] *= speedup_factor
-                ball_state['vy'] *= speedup_factor
+        if ball.vx > 0:
+            right_paddle = self.game_state.right
+            if self.check_paddle_collision(ball, right_paddle):
+                self.reflect_ball(ball, right_paddle)
+                ball.vx *= speedup_factor
+                ball.vy *= speedup_factor
                 
-    def check_paddle_collision(self, ball_state, ball_config, paddle, paddle_config):
-        horizontally_collides = False
-        vertically_collides = False
-        ball_radius = ball_config['diameter'] / 2
-
-        if paddle['x'] == 0: # Left paddle
-            ball_edge_x = ball_state['x']  # Left edge of the ball
-            paddle_edge_x = paddle['x'] + paddle_config['width'] # Right edge of the paddle
-            if ball_edge_x < paddle_edge_x:
-                horizontally_collides = True
-        else: # Right paddle
-            ball_edge_x = ball_state['x'] # Right edge of the ball
-            paddle_edge_x = paddle['x'] # Left edge of the paddle
-            if ball_edge_x > paddle_edge_x:
-                horizontally_collides = True
+    def sweep_ball(self, dt, max_bounces=8):
+        """
+        Continuous alternative to update_ball_position() + handle_ball_collisions().
+        Moves the ball along its path for dt, finding the exact time of each
+        wall or paddle impact inside the step and resolving them in order, so
+        the ball cannot tunnel through a paddle and the outcome does not
+        depend on the tick rate. Paddles are taken at their position at the
+        start of the step.
+        """
+        config = self.config
+        ball = self.game_state.ball
+        radius = config.ball_radius
+        speedup_factor = config.speedup_factor
+        left_plane = config.paddle_width  # Right edge of the left paddle
+        right_plane = config.right_paddle_x  # Left edge of the right paddle
+        remaining = dt
+
+        for _ in range(max_bounces):
+            impact_time = remaining
+            impact = None
+
+            # Walls
+            if ball.vy > 0:
+                t = max(0.0, (config.canvas_height - radius - ball.y) / ball.vy)
+                if t < impact_time:
+                    impact_time, impact = t, 'wall'
+            elif ball.vy < 0:
+                t = max(0.0, (radius - ball.y) / ball.vy)
+                if t < impact_time:
+                    impact_time, impact = t, 'wall'
+
+            # Paddle planes, only while the ball is still in front of them
+            if ball.vx < 0 and ball.x >= left_plane:
+                t = (left_plane - ball.x) / ball.vx
+                if t < impact_time:
+                    impact_time, impact = t, 'left'
+            elif ball.vx > 0 and ball.x <= right_plane:
+                t = (right_plane - ball.x) / ball.vx
+                if t < impact_time:
+                    impact_time, impact = t, 'right'
+
+            ball.x += ball.vx * impact_time
+            ball.y += ball.vy * impact_time
+            remaining -= impact_time
+
+            if impact is None:
+                break
+            if impact == 'wall':
+                ball.vy = -ball.vy * speedup_factor
+                ball.vx *= speedup_factor
+            else:
+                paddle = self.game_state.paddle(impact)
+                if not (paddle.y - radius <= ball.y <= paddle.y + config.paddle_height + radius):
+                    # Missed the paddle, nothing left to hit on this side
+                    ball.x += ball.vx * remaining
+                    ball.y += ball.vy * remaining
+                    break
+                self.reflect_ball(ball, paddle)
+                ball.vx *= speedup_factor
+                ball.vy *= speedup_factor
+
+    def check_paddle_collision(self, ball, paddle):
+        return self.hits_paddle('left' if paddle.x == 0 else 'right', paddle.y, ball.x, ball.y)
+
+    def hits_paddle(self, side, paddle_y, ball_x, ball_y):
+        """
+        check_paddle_collision() for any paddle and ball position, used
+        against past positions by lag.py.
+        """
+        config = self.config
+        ball_radius = config.ball_radius
+
+        if side == 'left':
+            # Left edge of the ball against the right edge of the paddle
+            horizontally_collides = ball_x < config.paddle_width
+        else:
+            # Right edge of the ball against the left edge of the paddle
+            horizontally_collides = ball_x > config.right_paddle_x
 
         # Check vertical overlap
-        ball_top = ball_state['y'] - ball_radius
-        ball_bottom = ball_state['y'] + ball_radius
-        paddle_top = paddle['y']
-        paddle_bottom = paddle['y'] + paddle_config['height']
+        ball_top = ball_y - ball_radius
+        ball_bottom = ball_y + ball_radius
+        paddle_top = paddle_y
+        paddle_bottom = paddle_y + config.paddle_height
 
-        if paddle_top <= ball_top <= paddle_bottom or paddle_top <= ball_bottom <= paddle_bottom:
-            vertically_collides = True
+        vertically_collides = paddle_top <= ball_top <= paddle_bottom or paddle_top <= ball_bottom <= paddle_bottom
 
         return horizontally_collides and vertically_collides
 
-    def reflect_ball(self, ball, paddle, paddle_config):
-            relative_hit = (ball['y'] - (paddle['y'] + paddle_config['height'] / 2)) / (paddle_config['height'] / 2)
-            ball['vx'] = -ball['vx']
-            ball['vy'] = 600 * relative_hit
+    def reflect_ball(self, ball, paddle):
+        half_height = self.config.paddle_height / 2
+        relative_hit = (ball.y - (paddle.y + half_height)) / half_height
+        ball.vx = -ball.vx
+        ball.vy = 600 * relative_hit
 
     def reset_game(self):
         game_state = self.game_state
-        config = self.manager.config
+        config = self.config
         # Reset scores
-        game_state['paddles']['left']['score'] = 0
-        game_state['paddles']['right']['score'] = 0
+        game_state.left.score = 0
+        game_state.right.score = 0
 
         # Reset paddle positions
-        game_state['paddles']['left']['y'] = config['canvas']['height'] / 2 - 50
-        game_state['paddles']['right']['y'] = config['canvas']['height'] / 2 - 50
-        game_state['paddles']['left']['x'] = 0  # Keep at left edge
-        game_state['paddles']['right']['x'] = config['canvas']['width'] - config['paddle']['width']
+        game_state.left.y = config.canvas_height / 2 - 50
+        game_state.right.y = config.canvas_height / 2 - 50
+        game_state.left.x = 0  # Keep at left edge
+        game_state.right.x = config.right_paddle_x
 
         # Reset ball position and velocity
-        game_state['ball']['x'] = config['canvas']['width'] / 2
-        game_state['ball']['y'] = config['canvas']['height'] / 2
-        game_state['ball']['vx'] = config['ball']['speed'] * (-1 if random.random() < 0.5 else 1)
-        game_state['ball']['vy'] = config['ball']['speed'] * (-1 if random.random() < 0.5 else 1)
+        game_state.ball.x = config.canvas_width / 2
+        game_state.ball.y = config.canvas_height / 2
+        x_sign, y_sign = game_state.serve_signs()
+        game_state.ball.vx = config.ball_speed * x_sign
+        game_state.ball.vy = config.ball_speed * y_sign
 
         # Reset game state flags
-        game_state['game_started'] = False
-        game_state['paused'] = True
-
-        game_state.clear()
-
-    def normalize_state(self):
-        """
-        Converts absolute game state positions into relative values (0 to 1) 
-        for standardized broadcasting.
-        """
-        config = self.manager.config
-        canvas_width = config['canvas']['width']
-        canvas_height = config['canvas']['height']
-    
-        return {
-            'type': 'state_update',
-            'ball': {
-                'x': self.game_state['ball']['x'] / canvas_width,
-                'y': self.game_state['ball']['y'] / canvas_height,
-                'vx': self.game_state['ball']['vx'] / canvas_width,
-                'vy': self.game_state['ball']['vy'] / canvas_height,
-                'render': self.game_state['ball']['render'],
-            },
-            'paddles': {
-                'left': {
-                    'x': self.game_state['paddles']['left']['x'] / canvas_width,
-                    'y': self.game_state['paddles']['left']['y'] / canvas_height,
-                    'score': self.game_state['paddles']['left']['score'],
-                },
-                'right': {
-                    'x': self.game_state['paddles']['right']['x'] / canvas_width,
-                    'y': self.game_state['paddles']['right']['y'] / canvas_height,
-                    'score': self.game_state['paddles']['right']['score'],
-                },
-            }
-        }
-
+        game_state.game_started = False
+        game_state.paused = True
 
     async def handle_scoring(self):
         """
         Check if a goal was scored and update the game state.
         If the game is over, notify the GameManager.
         """
-        ball_state = self.game_state['ball']
-        canvas = self.manager.config['canvas']
-
-        if ball_state['x'] < 0:  # Left side (point for right paddle)
-            self.game_state['paddles']['right']['score'] += 1
-            await self.manager.notify_score(self.room_id, "right")
-            await self.reset_ball('right')
-
-        elif ball_state['x'] > canvas['width']:  # Right side (point for left paddle)
-            self.game_state['paddles']['left']['score'] += 1
-            await self.manager.notify_score(self.room_id, "left")
-            await self.reset_ball('left')
-        self.broadcast_state()
+        ball = self.game_state.ball
+
+        if ball.x < 0:  # Left side (point for right paddle)
+            await self.score_goal('right')
+
+        elif ball.x > self.config.canvas_width:  # Right side (point for left paddle)
+            await self.score_goal('left')
+
+    async def score_goal(self, scoring_side):
+        if self.lag.hold_goal(self.step_count, 'left' if scoring_side == 'right' else 'right'):
+            return  # The losing side's late inputs may still save it, see lag.py
+        paddle = self.game_state.paddle(scoring_side)
+        paddle.score += 1
+        self.reset_ball(scoring_side)
+        if paddle.score >= self.config.score_to_win:
+            self.game_state.phase = OVER
+            self.encoder.force_keyframe()
+        else:
+            self.start_phase(SERVING, self.config.serve_delay)
+        await self.manager.notify_score(self.room_id, scoring_side)
 
-    async def reset_ball(self, lost_side):
+    def reset_ball(self, lost_side):
         """
-        Reset the ball after a score, pausing briefly before resuming.
+        Hide the ball and put it back in the middle after a score.
         """
-        ball = self.game_state['ball']
-        canvas = self.manager.config['canvas']
-        self.manager.config = self.manager.config
-
-        # Hide ball during reset
-        ball['render'] = False
-        ball['x'] = canvas['width'] / 2
-        ball['y'] = canvas['height'] / 2
-        ball['vx'] = self.manager.config['ball']['speed'] if lost_side == 'left' else -(self.manager.config['ball']['speed'])
-        ball['vy'] = self.manager.config['ball']['speed'] * (-1 if random.random() < 0.5 else 1)
-
-        # Small delay before ball becomes active again
-        await asyncio.sleep(1)
-        ball['render'] = True
+        ball = self.game_state.ball
+        config = self.config
+
+        ball.render = False
+        ball.x = config.canvas_width / 2
+        ball.y = config.canvas_height / 2
+        _, y_sign = self.game_state.serve_signs()
+        ball.vx = config.ball_speed if lost_side == 'left' else -config.ball_speed
+        ball.vy = config.ball_speed * y_sign
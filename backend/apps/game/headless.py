@@ -0,0 +1,232 @@
+"""
+Headless game simulation: runs GameLoops on a stub manager and a null
+channel layer, without Django, Redis or Daphne, as fast as possible.
+
+    cd backend && python -m apps.game.headless --rooms 200 --ticks 2000 --mode PVC
+
+Ticks are driven by calling TickScheduler.tick() directly, so nothing
+waits on the wall clock between ticks.
+"""
+import argparse, asyncio, random, statistics, time, tracemalloc
+
+from apps.game.game_loop import GameLoop
+from apps.game.scheduler import TickScheduler
+from apps.game.state import RoomConfig, RoomState, PlayerState, default_config
+
+# GameManager's config, with rooms that keep playing for the whole run
+CONFIG = default_config(score_to_win=255, countdown_seconds=0)
+
+MODES = ("PVP", "PVC", "TRNMT")
+
+
+class NullChannelLayer:
+    """
+    Accepts everything the game sends and only counts it.
+    """
+    def __init__(self):
+        self.messages = 0
+        self.frame_bytes = 0
+
+    async def group_send(self, group, message):
+        self.messages += 1
+        frame = message.get('frame')
+        if frame:
+            self.frame_bytes += len(frame)
+
+    async def send(self, channel, message):
+        self.messages += 1
+
+
+class StubManager:
+    """
+    The parts of GameManager a GameLoop talks to. Goals are only counted.
+    """
+    def __init__(self, config=CONFIG):
+        self.config = config
+        self.channel_layer = NullChannelLayer()
+        self.scheduler = TickScheduler(tick_rate=config['tick_rate'])
+        self.scheduler.use_engines(config)
+        self.goals = 0
+
+    async def notify_score(self, room_id, scoring_side):
+        self.goals += 1
+
+
+def make_room(index, config, mode="PVP", seed=None):
+    """
+    A started room with the users the given mode would have.
+    TRNMT rooms have two players and two spectators.
+    """
+    users = {"PVP": ["1", "2"], "PVC": ["1"], "TRNMT": ["1", "2", "3", "4"]}[mode]
+    kwargs = {'room_id': f"headless-{index}", 'game_type': mode, 'users': users, 'user_id': users[0]}
+    if mode == "TRNMT":
+        kwargs['tournament_id'] = f"headless-tournament-{index}"
+        kwargs['next_players'] = users[:2]
+    if seed is not None:
+        kwargs['seed'] = seed
+    room = RoomState(config, **kwargs)
+    room.players[users[0]] = PlayerState(users[0], 'left')
+    if mode != "PVC":
+        room.players[users[1]] = PlayerState(users[1], 'right')
+    for user_id in users[2:]:
+        room.spectators[user_id] = PlayerState(user_id)
+    for user in list(room.players.values()) + list(room.spectators.values()):
+        user.ready = True
+    room.game_started = True
+    return room
+
+
+class ScriptedInput:
+    """
+    Input source for the human sides of a room. 'bot' tracks the ball like
+    a decent player would; 'random' mashes keys from a seeded rng.
+    """
+    def __init__(self, loop, script="bot", seed=0):
+        self.loop = loop
+        self.script = script
+        self.rng = random.Random(seed)
+
+    def events(self):
+        loop = self.loop
+        room = loop.game_state
+        for user_id, player in room.players.items():
+            if self.script == "random":
+                if self.rng.random() < 0.2:
+                    up = self.rng.random() < 0.5
+                    yield {"type": "player_input", "user_id": user_id, "input": {"up": up, "down": not up}}
+                continue
+            # Like a real player, the bot only sees the frames the room sends
+            if loop.tick_count % loop.send_interval:
+                continue
+            loop.pull_physics()
+            paddle = room.paddle(player.side)
+            center = paddle.y + room.config.paddle_height / 2
+            up, down = center > room.ball.y + 10, center < room.ball.y - 10
+            if up != player.up or down != player.down:
+                yield {"type": "player_input", "user_id": user_id, "input": {"up": up, "down": down}}
+
+
+class HeadlessRunner:
+    def __init__(self, rooms=100, mode="PVP", script="bot", seed=0, config=None):
+        self.config = dict(CONFIG, **(config or {}))
+        self.manager = StubManager(self.config)
+        room_config = RoomConfig(self.config)
+        self.loops = []
+        self.inputs = []
+        for index in range(rooms):
+            loop = GameLoop(f"headless-{index}", self.manager, make_room(index, room_config, mode, seed + index))
+            loop.input_log.record = True  # Kept in memory, so runs can be replayed, see tests.py
+            self.loops.append(loop)
+            self.inputs.append(ScriptedInput(loop, script, seed + index))
+
+    async def start(self):
+        scheduler = self.manager.scheduler
+        for loop in self.loops:
+            loop.running = True
+            # Registered by hand so the scheduler's own timed task never starts
+            scheduler.loops[loop.room_id] = loop
+
+    async def step(self):
+        for source in self.inputs:
+            for event in source.events():
+                source.loop.mailbox.put(event)
+        await self.manager.scheduler.tick()
+
+    async def run(self, ticks, warmup=50):
+        """
+        Run `ticks` ticks and return per-tick durations in seconds.
+        """
+        await self.start()
+        for _ in range(warmup):
+            await self.step()
+        durations = []
+        clock = time.perf_counter
+        for _ in range(ticks):
+            start = clock()
+            await self.step()
+            durations.append(clock() - start)
+        return durations
+
+    async def measure_allocations(self, ticks):
+        """
+        Peak bytes allocated within a tick and bytes still held after it,
+        averaged over `ticks`. Run separately because tracemalloc slows
+        everything down.
+        """
+        tracemalloc.start()
+        peaks = []
+        retained = []
+        for _ in range(ticks):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await self.step()
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+        tracemalloc.stop()
+        return statistics.mean(peaks), statistics.mean(retained)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_scenario(rooms=100, ticks=1000, mode="PVP", script="bot", alloc_ticks=100, seed=0, config=None):
+    """
+    Run one scenario and return a dict of its measurements.
+    """
+    runner = HeadlessRunner(rooms, mode, script, seed, config)
+
+    async def run():
+        durations = await runner.run(ticks)
+        peak, retained = await runner.measure_allocations(alloc_ticks) if alloc_ticks else (0, 0)
+        return durations, peak, retained
+
+    durations, peak, retained = asyncio.run(run())
+    total = sum(durations)
+    layer = runner.manager.channel_layer
+    return {
+        'mode': mode,
+        'rooms': rooms,
+        'engine': runner.config['physics_engine'],
+        'ai_engine': runner.config['ai_engine'],
+        'ticks_per_sec': ticks / total,
+        'room_ticks_per_sec': ticks * rooms / total,
+        'p50_ms': percentile(durations, 0.50) * 1000,
+        'p99_ms': percentile(durations, 0.99) * 1000,
+        'alloc_peak_bytes': peak,
+        'alloc_retained_bytes': retained,
+        'goals': runner.manager.goals,
+        'messages': layer.messages,
+        'frame_bytes': layer.frame_bytes,
+    }
+
+
+def format_result(result):
+    return (
+        f"{result['mode']:<6} {result['engine']:<7} ai={result['ai_engine']:<7} rooms={result['rooms']:<5} "
+        f"ticks/s={result['ticks_per_sec']:>8.1f}  room-ticks/s={result['room_ticks_per_sec']:>10.0f}  "
+        f"p50={result['p50_ms']:.3f}ms  p99={result['p99_ms']:.3f}ms  "
+        f"alloc/tick={result['alloc_peak_bytes']:.0f}B peak {result['alloc_retained_bytes']:.0f}B kept  "
+        f"goals={result['goals']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--ticks', type=int, default=1000)
+    parser.add_argument('--mode', choices=MODES, default="PVP")
+    parser.add_argument('--script', choices=("bot", "random"), default="bot")
+    parser.add_argument('--engine', choices=("python", "numpy"), default="python")
+    parser.add_argument('--collision', choices=("discrete", "swept"), default="discrete")
+    parser.add_argument('--ai', choices=("python", "numpy"), help="Defaults to --engine")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    config = {'physics_engine': args.engine, 'collision_mode': args.collision, 'ai_engine': args.ai or args.engine}
+    print(format_result(run_scenario(args.rooms, args.ticks, args.mode, args.script, seed=args.seed, config=config)))
+
+
+if __name__ == '__main__':
+    main()
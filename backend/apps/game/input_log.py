@@ -0,0 +1,141 @@
+"""
+Input logs: what a match needs besides its seed to be replayed exactly.
+
+A match is fully determined by its room seed, the game config and what came
+from outside the simulation: player inputs, the start of the countdown and
+watchdog changes to the AI prediction rate. The ball's serve directions and
+the AI's prediction error are drawn from the room seed
+(RoomState.serve_signs(), AIState.rng) and serve delays are counted in
+steps, so nothing else needs to be stored. Input delays are wall clock,
+so the rewinds they led to are logged too, see lag.py.
+
+Each entry is one uint32, `step << 4 | code`, where `step` is the number of
+simulation steps that had run when it happened. The replay applies it
+before simulating that step.
+
+    code  entry
+    0-3   left input   (up << 1 | down)
+    4-7   right input  4 + (up << 1 | down)
+    8     countdown    all players ready, GameLoop.start_countdown()
+    9     AI normal    re-predict on every step
+    10    AI reduced   re-predict every tick_rate // 10 steps
+    11    rewind       the next input was rewound `step` steps; this one
+                       entry holds a step count instead of a step
+
+A replay file is one line of JSON header followed by the entries as
+little-endian uint32, so 4 bytes per input change: a 5 minute match with
+a few key changes per second per player is around 10 KB. Recording is off
+unless replay_dir is set: the log then keeps no entries, it only tracks
+which inputs changed. Only the newest replay_keep files are kept.
+
+replay.py rebuilds a match from its file.
+"""
+import array, json, os, sys, time
+
+COUNTDOWN = 8
+AI_NORMAL = 9
+AI_REDUCED = 10
+REWIND = 11
+SIDE_CODES = {'left': 0, 'right': 4}
+MAX_STEP = (1 << 28) - 1  # About 52 days at 60 Hz
+
+
+class InputLog:
+    def __init__(self, record=True):
+        self.record = record  # False keeps no entries, so nothing grows
+        self.entries = array.array('I')
+        self.inputs = {'left': 0, 'right': 0}  # Last logged up/down bits per side
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, step, code):
+        if self.record:
+            self.entries.append(min(step, MAX_STEP) << 4 | code)
+
+    def input(self, step, side, up, down, rewind=0):
+        """
+        Log a side's input if it changed since the last entry for that side,
+        with the steps it was rewound. Returns True if it changed, whether
+        or not it was recorded.
+        """
+        bits = up << 1 | down
+        if side in self.inputs and self.inputs[side] != bits:
+            self.inputs[side] = bits
+            if rewind:
+                # Never ahead of the input's own step, so the replay reads both together
+                self.append(rewind, REWIND)
+            self.append(step, SIDE_CODES[side] + bits)
+            return True
+        return False
+
+    def countdown(self, step):
+        self.append(step, COUNTDOWN)
+
+    def ai_interval(self, step, reduced):
+        self.append(step, AI_REDUCED if reduced else AI_NORMAL)
+
+    def to_bytes(self):
+        entries = self.entries
+        if sys.byteorder != 'little':
+            entries = array.array('I', entries)
+            entries.byteswap()
+        return entries.tobytes()
+
+
+def replay_header(loop):
+    """
+    Everything besides the log that the replay needs to rebuild the match.
+    """
+    game_state = loop.game_state
+    return {
+        'version': 1,
+        'room_id': game_state.room_id,
+        'seed': game_state.seed,
+        'game_type': game_state.game_attributes.get('game_type'),
+        'users': game_state.game_attributes.get('users'),
+        'players': {player.side: player.user_id for player in game_state.players.values()},
+        'ai_difficulty': game_state.ai.profile.name,
+        'config': loop.manager.config,
+        'steps': loop.step_count,
+        'score': [game_state.left.score, game_state.right.score],
+        'recorded_at': int(time.time()),
+    }
+
+
+def write_replay(path, header, log):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(json.dumps(header).encode() + b'\n')
+        f.write(log.to_bytes())
+
+
+def prune_replays(directory, keep):
+    """
+    Delete all but the `keep` newest replays in `directory`. Returns how
+    many were deleted.
+    """
+    replays = [entry for entry in os.scandir(directory) if entry.name.endswith('.replay') and entry.is_file()]
+    if len(replays) <= keep:
+        return 0
+    replays.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    deleted = 0
+    for entry in replays[keep:]:
+        try:
+            os.remove(entry.path)
+            deleted += 1
+        except FileNotFoundError:
+            pass  # Pruned by another process
+    return deleted
+
+
+def read_replay(path):
+    """
+    Returns (header, entries).
+    """
+    with open(path, 'rb') as f:
+        header = json.loads(f.readline())
+        entries = array.array('I', f.read())
+    if sys.byteorder != 'little':
+        entries.byteswap()
+    return header, entries
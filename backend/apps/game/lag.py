@@ -0,0 +1,147 @@
+"""
+Lag compensation for human players.
+
+An input reaches the room some time after the player pressed the key while
+watching the ball where the server had it then. To judge the input against
+what the player saw, the room keeps the positions of the last `size` steps
+in a ring buffer: one preallocated array('d') per column, indexed by
+step % size and written after every step, before the AI paddle moves
+(GameLoop.update_game_state(), or the batched engine, which keeps the
+columns in its own arrays while it steps the room), so recording
+allocates nothing.
+
+The consumer turns the client's synced clock (see clockSync.js) into the
+input's delay. The room rewinds that many steps, capped at max_rewind and
+at the side's previous input, and replays the player's paddle from there
+with the new keys, rewriting its history:
+- if the ball went past that paddle in the meantime and the rewritten paddle
+  was in its way, the ball is put back where it hit, bounces and moves on
+  by the steps since;
+- a goal against a side waits as many steps as that side's last rewind, so
+  its late inputs can still save it; a hold that runs out clears the
+  rewind, see hold_goal().
+
+Rewinds are logged with the inputs, so replays do the same, see input_log.py.
+"""
+from array import array
+
+SIDES = ('left', 'right')
+
+
+class LagCompensator:
+    __slots__ = (
+        'max_rewind', 'size', 'first', 'left', 'right', 'ball_x', 'ball_y', 'ball_vx',
+        'rewinds', 'input_steps', 'held',
+    )
+
+    def __init__(self, max_rewind):
+        self.max_rewind = max_rewind  # Steps
+        self.size = size = max_rewind + 1
+        self.first = None  # First step recorded
+        zeros = bytes(array('d').itemsize * size)
+        self.left = array('d', zeros)  # Paddle y after each step
+        self.right = array('d', zeros)
+        self.ball_x = array('d', zeros)
+        self.ball_y = array('d', zeros)
+        self.ball_vx = array('d', zeros)
+        self.rewinds = dict.fromkeys(SIDES, 0)  # Steps the last input of each side was rewound
+        self.input_steps = dict.fromkeys(SIDES, 0)  # Step the last input of each side took effect
+        self.held = dict.fromkeys(SIDES)  # (first, last) step a goal against the side was held
+
+    def columns(self):
+        return self.left, self.right, self.ball_x, self.ball_y, self.ball_vx
+
+    def use(self, left, right, ball_x, ball_y, ball_vx):
+        """
+        Keep the history in other buffers of `size` floats, e.g. the rows of
+        BatchPhysics, carrying over what was recorded so far.
+        """
+        for buffer, column in zip((left, right, ball_x, ball_y, ball_vx), self.columns()):
+            buffer[:] = array('d', column)
+        self.left, self.right, self.ball_x, self.ball_y, self.ball_vx = left, right, ball_x, ball_y, ball_vx
+
+    def record(self, step, game_state):
+        index = step % self.size
+        ball = game_state.ball
+        self.left[index] = game_state.left.y
+        self.right[index] = game_state.right.y
+        self.ball_x[index] = ball.x
+        self.ball_y[index] = ball.y
+        self.ball_vx[index] = ball.vx
+        if self.first is None:
+            self.first = step
+
+    def rewind_steps(self, step, side, delay):
+        """
+        How many steps an input of `side` delayed by `delay` steps can be
+        rewound: no further than the history or the side's previous input.
+        """
+        if self.first is None or delay <= 0:
+            return 0
+        return max(0, min(delay, self.max_rewind, step - max(self.first, self.input_steps[side])))
+
+    def apply(self, loop, player, rewind):
+        """
+        Take an input of `player` that was logged rewound by `rewind` steps.
+        """
+        side = player.side
+        step = loop.step_count
+        self.rewinds[side] = rewind
+        self.input_steps[side] = step - rewind
+        if not rewind:
+            return
+
+        config = loop.config
+        ball = loop.game_state.ball
+        paddle = loop.game_state.paddle(side)
+        history = self.left if side == 'left' else self.right
+        paddle_step = config.paddle_speed / config.tick_rate
+        max_paddle_y = config.max_paddle_y
+        # Only a ball already past this side's paddle needs saving
+        if side == 'left':
+            missed = ball.render and ball.vx < 0 and ball.x < config.paddle_width
+        else:
+            missed = ball.render and ball.vx > 0 and ball.x > config.right_paddle_x
+
+        y = float(history[(step - rewind) % self.size])
+        for past in range(step - rewind + 1, step + 1):
+            index = past % self.size
+            # The ball of each step meets the paddle of the step before, like update_game_state()
+            if missed and (self.ball_vx[index] < 0) == (side == 'left') \
+                    and loop.hits_paddle(side, y, self.ball_x[index], self.ball_y[index]):
+                ball.x = float(self.ball_x[index])
+                ball.y = float(self.ball_y[index])
+                ball.vx = float(self.ball_vx[index])
+                paddle.y = y
+                loop.reflect_ball(ball, paddle)
+                ball.vx *= config.speedup_factor
+                ball.vy *= config.speedup_factor
+                elapsed = (step - past) / config.tick_rate
+                ball.x += ball.vx * elapsed
+                ball.y += ball.vy * elapsed
+                missed = False
+                self.held[side] = None
+            if player.up:
+                y -= paddle_step
+            if player.down:
+                y += paddle_step
+            y = max(0, min(y, max_paddle_y))
+            history[index] = y
+        paddle.y = y
+
+    def hold_goal(self, step, lost_side):
+        """
+        True while a goal against `lost_side` has to wait for its late inputs.
+        """
+        rewind = self.rewinds[lost_side]
+        if not rewind:
+            return False
+        held = self.held[lost_side]
+        first = held[0] if held is not None and held[1] == step - 1 else step
+        if step - first < rewind:
+            self.held[lost_side] = (first, step)
+            return True
+        # No late input came: the next goal is not held until the side sends one
+        self.held[lost_side] = None
+        self.rewinds[lost_side] = 0
+        return False
@@ -0,0 +1,95 @@
+"""
+In-process delivery of game groups.
+
+GameManager wraps the project's channel layer in a LocalChannelLayer. Game
+consumers join their room group with a reference to themselves, and frames
+and game messages sent to a group whose members are all in this process are
+handed to their handlers in memory rather than going out to Redis and back
+into the same process.
+
+Every member also joins the group in the real channel layer, so nobody
+depends on this process knowing them. Channels added without a consumer
+live on other processes (see registry.py); a group with such members, or
+with no local ones, is sent to through the real layer alone, which reaches
+the local members too, exactly once. Everything else (receive, new_channel,
+...) goes to the real layer unchanged.
+"""
+import logging
+from channels.consumer import get_handler_name
+logger = logging.getLogger(__name__)
+
+
+class LocalChannelLayer:
+    def __init__(self, layer):
+        self.layer = layer  # The real channel layer
+        self.consumers = {}  # {channel_name: consumer in this process}
+        self.groups = {}  # {group: {channel_name of a local consumer}}
+        self.remote_groups = {}  # {group: {channel_name on another process}}
+        self.local_messages = 0
+        self.remote_messages = 0
+
+    def __getattr__(self, name):
+        return getattr(self.layer, name)
+
+    async def group_add(self, group, channel, consumer=None):
+        if consumer is not None:
+            self.consumers[channel] = consumer
+            self.groups.setdefault(group, set()).add(channel)
+        else:
+            self.remote_groups.setdefault(group, set()).add(channel)
+        await self.layer.group_add(group, channel)
+
+    async def group_discard(self, group, channel):
+        local = self.groups.get(group)
+        if local is not None and channel in local:
+            local.discard(channel)
+            if not local:
+                del self.groups[group]
+            if not any(channel in members for members in self.groups.values()):
+                self.consumers.pop(channel, None)
+        remote = self.remote_groups.get(group)
+        if remote is not None:
+            remote.discard(channel)
+            if not remote:
+                del self.remote_groups[group]
+        await self.layer.group_discard(group, channel)
+
+    async def group_send(self, group, message):
+        local = self.groups.get(group)
+        if local and group not in self.remote_groups:
+            # Copied, a consumer may leave the group while we deliver
+            for channel in tuple(local):
+                await self.deliver(channel, message)
+        else:
+            self.remote_messages += 1
+            await self.layer.group_send(group, message)
+
+    async def send(self, channel, message):
+        if channel in self.consumers:
+            await self.deliver(channel, message)
+        else:
+            self.remote_messages += 1
+            await self.layer.send(channel, message)
+
+    async def deliver(self, channel, message):
+        """
+        Run the consumer's handler for `message` directly. Skips dispatch(),
+        which closes stale database connections in a thread on every call;
+        game handlers only write to the socket.
+        """
+        consumer = self.consumers.get(channel)
+        if consumer is None:
+            return
+        self.local_messages += 1
+        try:
+            await getattr(consumer, get_handler_name(message))(message)
+        except Exception as e:
+            logger.error(f"Could not deliver {message['type']} to {channel}: {e}")
+
+    def stats(self):
+        return {
+            'local_consumers': len(self.consumers),
+            'remote_groups': len(self.remote_groups),
+            'local_messages': self.local_messages,
+            'remote_messages': self.remote_messages,
+        }
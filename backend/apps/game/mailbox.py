@@ -0,0 +1,65 @@
+import logging
+logger = logging.getLogger(__name__)
+
+PAUSE_EVENTS = ("pause", "resume")  # Only the latest of a run of these matters
+
+
+class Mailbox:
+    def __init__(self, capacity=64, wake=None):
+        self.capacity = capacity  # Player inputs queued at most
+        self.wake = wake  # Called when an event arrives, see GameLoop.wake()
+        self.pending = []  # Events in arrival order
+        self.inputs = 0  # Player inputs in pending
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, event):
+        """
+        Queue an event for the next tick. Events apply in arrival order; one
+        that supersedes the event queued right before it replaces it, so a
+        player_input replaces the same user's input and a pause or resume
+        replaces a pause or resume. Only player inputs count against the
+        capacity: control events such as set_game_started or stop are always
+        queued. Returns False if an input was dropped because the mailbox is
+        full.
+        """
+        kind = event["type"]
+        pending = self.pending
+        if pending:
+            last = pending[-1]
+            if (kind == "player_input" and last["type"] == kind and last["user_id"] == event["user_id"]) \
+                    or (kind in PAUSE_EVENTS and last["type"] in PAUSE_EVENTS):
+                pending[-1] = event
+                self.coalesced += 1
+                return True
+        if kind == "player_input":
+            if self.inputs >= self.capacity:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    logger.warning(f"Mailbox full, dropped {self.dropped} inputs so far")
+                return False
+            self.inputs += 1
+
+        pending.append(event)
+        if self.wake and len(pending) == 1:
+            self.wake()
+        return True
+
+    def drain(self):
+        """
+        Return every pending event in order and empty the mailbox.
+        """
+        events = self.pending
+        self.pending = []
+        self.inputs = 0
+        return events
+
+    def stats(self):
+        return {
+            'pending': len(self.pending),
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+        }
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.game.checkpoint import DRAIN_KEY, DRAINED_KEY
+from apps.game.manager import game_manager
+
+
+class Command(BaseCommand):
+    help = (
+        "Hand live game rooms over before a restart: every running process "
+        "checkpoints its rooms to Redis and sends its players to reconnect. "
+        "See apps/game/checkpoint.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help="Drained processes to wait for")
+        parser.add_argument('--timeout', type=float, default=15, help="Seconds to wait for them")
+
+    def handle(self, *args, **options):
+        client = game_manager.redis_client
+        requested = time.time()
+        client.set(DRAIN_KEY, requested, ex=300)
+        self.stdout.write(f"Drain requested, waiting for {options['processes']} process(es)")
+
+        drained = {}
+        deadline = time.monotonic() + options['timeout']
+        while len(drained) < options['processes'] and time.monotonic() < deadline:
+            time.sleep(0.5)
+            for process, report in client.hgetall(DRAINED_KEY).items():
+                at, rooms = report.split()
+                if float(at) > requested and process not in drained:
+                    drained[process] = int(rooms)
+                    self.stdout.write(f"{process}: {rooms} rooms checkpointed")
+
+        if len(drained) < options['processes']:
+            self.stderr.write(f"Only {len(drained)} of {options['processes']} process(es) drained in time")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Drained {sum(drained.values())} rooms"))
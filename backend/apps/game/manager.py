@@ -1,18 +1,30 @@
-import logging, asyncio, redis, random
+import logging, asyncio, redis, time
 from channels.layers import get_channel_layer
+from django.conf import settings
 from collections import defaultdict
 from asyncio import Lock
 import traceback
 from contextlib import asynccontextmanager
 
 from apps.accounts.models import User
-from apps.game.game_loop import GameLoop
+from apps.game.checkpoint import CheckpointWriter, DRAINING_CLOSE_CODE, restore
+from apps.game.game_loop import GameLoop, player_group, spectator_group
+from apps.game.scheduler import TickScheduler
+from apps.game.local_layer import LocalChannelLayer
+from apps.game.protocol import game_message, server_clock_ms
+from apps.game.registry import RoomRegistry
+from apps.game.sharding import ShardPool
+from apps.game.state import RoomConfig, RoomState, PlayerState, ACTIVE, FINISHED, default_config
+from apps.game.sweeper import RoomSweeper
+from apps.game.tournaments import TournamentManager
 from apps.accounts.services import record_match 
 from asgiref.sync import sync_to_async
 from apps.matchmaking.manager import generate_shared_game_room_url
 
 logger = logging.getLogger(__name__)
 
+MAX_INPUT_DELAY_MS = 1000  # Rewinds are capped far lower, see lag.py
+
 class DebugLock(Lock):
     def __init__(self):
         super().__init__()
@@ -38,91 +50,220 @@ async def debug_lock(lock):
 
 class GameManager:
     def __init__(self, redis_host="redis", redis_port=6379):
-        self.games = {}  # {room_id: game_state_dict}
+        self.games = {}  # {room_id: RoomState}
         self.loops = {}  # {room_id: GameLoop}
         self.locks = defaultdict(DebugLock)
         self.CHANNEL_MAP_KEY = "game:channel_map"
-        self.channel_layer = get_channel_layer()
-        self.tournament_manager = TournamentManager()
+        self.channel_layer = LocalChannelLayer(get_channel_layer())
         self.redis_client = redis.StrictRedis(host=redis_host, port=redis_port, decode_responses=True)
-        self.config = {
-            'canvas': {'width': 800, 'height': 600},
-            'paddle': {
-                'height': int(600 * 0.2),
-                'width': int(800 * 0.02)
-            },
-            'ball': {
-                'diameter': int(800 * 0.03),
-                'speed': 350
-            }
-        }
-        self.SCORE_TO_WIN = 2
+        self.config = default_config(replay_dir=settings.GAME_REPLAY_DIR, nodes=settings.GAME_NODES)
+        self.scheduler = TickScheduler(tick_rate=self.config['tick_rate'])
+        self.scheduler.use_engines(self.config)
+        self.tournament_manager = TournamentManager(self.redis_client, ttl=self.config['tournament_timeout_seconds'])
+        self.shards = ShardPool(self, self.config['shards']) if self.config['shards'] else None
+        if self.shards:
+            logger.warning("Rooms run in game shards and are not checkpointed, see sharding.py")
+        self.SCORE_TO_WIN = self.config['score_to_win']
+        self.end_game_tasks = set()  # Keeps running end_game tasks referenced
+        self.sweeper = RoomSweeper(
+            self,
+            interval=self.config['sweep_interval_seconds'],
+            idle_timeout=self.config['idle_timeout_seconds'],
+            finished_grace=self.config['finished_grace_seconds'],
+            tournament_timeout=self.config['tournament_timeout_seconds'],
+        )
+        # Own client, checkpoints are binary
+        self.checkpoints = CheckpointWriter(
+            self,
+            redis.StrictRedis(host=redis_host, port=redis_port),
+            interval=self.config['checkpoint_interval_seconds'],
+            ttl=self.config['checkpoint_ttl_seconds'],
+        )
+        self.draining = False  # Set by drain(), no rooms run here any more
+        self.registry = RoomRegistry(
+            self, self.redis_client, lease=self.config['lease_seconds'], shared=self.config['nodes'] > 1,
+        )
+
+    def start(self):
+        """
+        Start the checkpoint writer as soon as the process serves, not with
+        its first room: its rounds also poll DRAIN_KEY, and drain_games
+        waits for every process, rooms or not. Called at ASGI lifespan
+        startup where the server sends one (see routing.py), and on every
+        consumer connect for servers like Daphne that do not.
+        """
+        self.checkpoints.start()
 
     async def create_or_get_game(self, **kwargs):
         room_id = kwargs.get("room_id")
         async with self.locks[room_id]:
+            game = self.games.get(room_id)
+            if game is not None and game.lifecycle == FINISHED:
+                # The room id is joined again for a new match
+                await self.free_room(room_id, "room reused")
             if room_id not in self.games:
-                initial_state = self.initial_game_state(**kwargs)
+                checkpoint = None if self.shards else await self.checkpoints.load(room_id)
+                if checkpoint:
+                    initial_state, step_count, tick_count = restore(self.config, checkpoint)
+                    loop = GameLoop(room_id, self, initial_state)
+                    loop.step_count, loop.tick_count = step_count, tick_count
+                    loop.resumed = True
+                    self.checkpoints.resumed += 1
+                    logger.info(f"Resumed room {room_id} from its checkpoint at step {step_count}")
+                else:
+                    initial_state = self.initial_game_state(**kwargs)
+                    if self.shards:
+                        loop = self.shards.create_loop(room_id, initial_state, kwargs)
+                    else:
+                        loop = GameLoop(room_id, self, initial_state)
                 self.games[room_id] = initial_state
-                loop = GameLoop(room_id, self, initial_state)
                 self.loops[room_id] = loop
-                asyncio.create_task(loop.start())
-                logger.info("Continue in gamemanager after loop.start()")
+                await loop.start()
+                self.sweeper.start()
             return self.games[room_id]
 
+    async def forward(self, room_id, method, *args):
+        """
+        Run a manager method on the node that owns the room instead, if the
+        room runs on another node. Returns True if the call was forwarded.
+        """
+        if room_id in self.games:
+            return False
+        owner = self.registry.remote.get(room_id)
+        if owner is None:
+            return False
+        await self.registry.send(owner, {'type': 'room.call', 'method': method, 'args': [room_id, *args]})
+        return True
+
     async def send_event_to_game(self, room_id, event):
         """
         Send an event to a specific GameLoop.
         """
         if room_id in self.loops:
-            await self.loops[room_id].queue.put(event)
+            self.loops[room_id].mailbox.put(event)
+            game_state = self.games.get(room_id)
+            if game_state is not None:
+                game_state.last_event = time.monotonic()
 
-    async def update_player_input(self, room_id, user_id, up, down):
+    async def update_player_input(self, room_id, user_id, up, down, seq=None, sent=None):
         """
-        Send a player input update to the GameLoop.
+        Send a player input update to the GameLoop. `seq` is the client's
+        input sequence number and `sent` when the player pressed, on the
+        clock of the node running the room (see clock_sync()), if it sent
+        them. An implausible `sent` is taken as on time.
         """
-        event = {"type": "player_input", "user_id": user_id, "input": {"up": up, "down": down}}
+        if await self.forward(room_id, 'update_player_input', user_id, up, down, seq, sent):
+            return
+        delay = None
+        if sent is not None:
+            delay = (server_clock_ms() - sent) & 0xFFFFFFFF
+            if delay > MAX_INPUT_DELAY_MS:
+                delay = None
+        event = {"type": "player_input", "user_id": user_id, "input": {"up": up, "down": down}, "seq": seq, "delay": delay}
         await self.send_event_to_game(room_id, event)
 
+    async def clock_sync(self, room_id, channel, client_time):
+        """
+        Echo a client's send time to its channel with the clock that stamps
+        the room's frames, so it can estimate its offset to server_time.
+        That is the clock of the node running the room.
+        """
+        if await self.forward(room_id, 'clock_sync', channel, client_time):
+            return
+        await self.channel_layer.send(channel, game_message({
+            'type': 'clock_sync',
+            'client_time': client_time,
+            'server_time': server_clock_ms(),
+        }))
+
     async def set_game_paused(self, room_id, paused=True):
         """
         Send a pause or resume event to the GameLoop.
         """
+        if await self.forward(room_id, 'set_game_paused', paused):
+            return
         event = {"type": "pause" if paused else "resume"}
         await self.send_event_to_game(room_id, event)
 
     async def set_game_started(self, room_id, user_id):
         """
-        Send a pause or resume event to the GameLoop.
+        Send a player ready event to the GameLoop.
         """
+        if await self.forward(room_id, 'set_game_started', user_id):
+            return
         event = {"type": "set_game_started", "user_id": user_id}
+        game_state = self.games.get(room_id)
+        if game_state is not None and game_state.lifecycle != FINISHED:
+            game_state.set_lifecycle(ACTIVE)
         await self.send_event_to_game(room_id, event)
 
     async def stop_game(self, room_id):
         """
         Stop the GameLoop for a room.
         """
-        if room_id in self.loops:
-            await self.send_event_to_game(room_id, {"type": "stop"})
-            await self.loops[room_id].stop()
-            del self.loops[room_id]
-            del self.games[room_id]
-            
+        await self.reclaim_room(room_id, "stopped")
+
     async def remove_game(self, room_id):
-        if room_id not in self.locks:
-            logger.debug(f"No lock found for room: {room_id}, skipping removal.")
+        # The checkpoint stays, the players may be back after a restart
+        await self.reclaim_room(room_id, "every player left", keep_checkpoint=True)
+
+    async def reclaim_room(self, room_id, reason, keep_checkpoint=False):
+        """
+        Stop a room's GameLoop and free its state, loop, lock and lease.
+        """
+        lock = self.locks.get(room_id)
+        if lock is None:
+            await self.free_room(room_id, reason, keep_checkpoint)
+            await self.registry.release([room_id])
             return
-        
-        # Acquire the lock for this room
-        async with debug_lock(self.locks[room_id]):
-            if room_id in self.games:
-                del self.games[room_id]
-                logger.debug(f"Removed game state for room: {room_id}")
-    
-        # Delete the lock after releasing it
-        if room_id in self.locks:
+        async with debug_lock(lock):
+            await self.free_room(room_id, reason, keep_checkpoint)
+            await self.registry.release([room_id])
+        # Left in place if someone is waiting on it, the sweeper gets it later
+        if self.locks.get(room_id) is lock and not lock.locked():
             del self.locks[room_id]
-            logger.debug(f"Removed lock for room: {room_id}")
+            self.sweeper.reclaimed['locks'] += 1
+
+    async def free_room(self, room_id, reason, keep_checkpoint=False):
+        """
+        Free a room's state and loop. The caller holds the room lock.
+        """
+        loop = self.loops.pop(room_id, None)
+        game_state = self.games.pop(room_id, None)
+        if not keep_checkpoint and not self.draining:
+            self.checkpoints.discard(room_id)
+        if loop is not None:
+            await loop.stop()
+            self.sweeper.reclaimed['loops'] += 1
+        if game_state is not None:
+            self.sweeper.reclaimed['rooms'] += 1
+        if loop is not None or game_state is not None:
+            logger.info(f"Reclaimed room {room_id} ({reason})")
+
+    def stats(self):
+        """
+        Counts of live and reclaimed rooms, loops, locks and tournaments.
+        """
+        return self.sweeper.stats()
+
+    async def drain(self):
+        """
+        Hand every room over before this process goes away: checkpoint and
+        stop them all, then close their sockets so clients reconnect and
+        resume the rooms from their checkpoints. See checkpoint.py.
+        """
+        self.draining = True
+        rooms = len(self.loops)
+        logger.warning(f"Draining {rooms} game rooms")
+        await self.checkpoints.write_all()
+        for loop in list(self.loops.values()):
+            await loop.stop(replay=False)
+        for consumer in list(self.channel_layer.consumers.values()):
+            await consumer.close(code=DRAINING_CLOSE_CODE)
+        # Other nodes take the rooms over as their players come back
+        await self.registry.release(list(self.games))
+        await self.checkpoints.drained(rooms)
+        logger.warning(f"Drained {rooms} game rooms")
 
     async def add_player(self, **kwargs):
         user_id = kwargs.get('user_id')
@@ -132,11 +273,7 @@ class GameManager:
     
         if game_type == "TRNMT":
             # Tournament-specific logic
-            next_players = kwargs.get("next_players")
-            if not next_players:
-                tournament = self.tournament_manager.tournaments.get(kwargs.get('tournament_id'))
-                next_players = [player for player, status in tournament.items() if status['is_active'] and not status['is_waiting']]
-                
+            next_players = self.next_players(**kwargs)
             logger.info(f"Next_players: {next_players}")
 
             # Create or retrieve the game state for the match
@@ -149,17 +286,20 @@ class GameManager:
             # Assign player to the current match
             if user_id not in next_players:
                 # Add to spectators if both player slots are filled
-                game['spectators'][user_id] = {'watching': True}
+                self.loops[room_id].spectator_encoder.force_keyframe()
+                game.spectators[user_id] = PlayerState(user_id)
+                if self.shards:
+                    self.shards.join(room_id, user_id)
                 logger.info(f"Added {user_id} as a spectator for match {room_id}")
                 return  # Spectators don't participate in the match directly
             
     
             # Update players in the game state
-            game['players'][user_id] = {
-                'side': 'left' if user_id == next_players[0] else 'right',
-                'input': {'up': False, 'down': False},
-                'alias': user_id,
-            }
+            self.loops[room_id].encoder.force_keyframe()
+            if user_id not in game.players:
+                game.players[user_id] = PlayerState(user_id, 'left' if user_id == next_players[0] else 'right')
+            if self.shards:
+                self.shards.join(room_id, user_id, game.players[user_id].side)
             logger.debug(f"Player {user_id} joined room {room_id} as {'left' if user_id == next_players[0] else 'right'}")
         
         else:
@@ -167,89 +307,132 @@ class GameManager:
             game = await self.create_or_get_game(**kwargs)
             if game is None:
                 raise RuntimeError(f"Could not create or retrieve game for room {room_id}")
+            self.loops[room_id].encoder.force_keyframe()
     
-            players = game['players']
-            side = 'left' if len(players) == 0 else 'right'
-            players[user_id] = {
-                'side': side,
-                'input': {'up': False, 'down': False},
-                'alias': user_id,
-            }
+            players = game.players
+            # A resumed room already has its players, keep their sides
+            side = players[user_id].side if user_id in players else 'left' if len(players) == 0 else 'right'
+            if user_id not in players:
+                players[user_id] = PlayerState(user_id, side)
+            if self.shards:
+                self.shards.join(room_id, user_id, side)
             logger.debug(f"Player {user_id} joined room {room_id} as {side}")
 
+    def next_players(self, **kwargs):
+        """
+        The two users playing the match of a tournament room, [left, right].
+        A side the bracket has not decided yet comes from the join token.
+        """
+        given = kwargs.get("next_players") or [None, None]
+        match = self.tournament_manager.match(kwargs.get('tournament_id'), kwargs.get('room_id'))
+        if match is None:
+            return given
+        return [known or token for known, token in zip(match.players, given)]
+
+    def is_spectator(self, **kwargs):
+        """
+        True if the user joins the room only to watch, see add_player().
+        """
+        return kwargs.get("game_type") == "TRNMT" and kwargs.get("user_id") not in self.next_players(**kwargs)
+
+    async def broadcast_message(self, room_id, data):
+        """
+        Send a JSON game message to the players and the spectators of a room.
+        """
+        message = game_message(data)
+        await self.channel_layer.group_send(player_group(room_id), message)
+        await self.channel_layer.group_send(spectator_group(room_id), message)
+
     async def remove_player(self, room_id, user_id):
+        if await self.forward(room_id, 'remove_player', user_id):
+            return
+        if room_id not in self.games:
+            return
         async with debug_lock(self.locks[room_id]):
             logger.info(f"remove_player() called for room_id={room_id}, user_id={user_id}")
             game = self.games.get(room_id)
             if not game:
                 return
-            if user_id in game['players']:
-                del game['players'][user_id]
+            left = game.spectators.pop(user_id, None) is not None
+            if user_id in game.players:
+                self.loops[room_id].touch_physics()
+                del game.players[user_id]
+                left = True
                 logger.debug(f"Player {user_id} left room {room_id}")
-    
-            # Optional: If no players left, you can remove the game from memory
-            if len(game['players']) == 0:
-                logger.info("Before calling remove_game()")
-                await self.remove_game(room_id)
-                logger.info("After calling remove_game()")
+            if left and self.shards:
+                self.shards.leave(room_id, user_id)
+            empty = len(game.players) == 0
+
+        # After releasing the lock, remove_game() takes it again
+        if empty:
+            await self.remove_game(room_id)
 
     async def notify_score(self, room_id, scoring_side):
         """
         Notify players of a score update and check if the game has ended.
         """
         game_state = self.games.get(room_id)
-        new_score = game_state['paddles'][scoring_side]['score']
-        # right_score = game_state['paddles']['right']['score']
+        if game_state is None:
+            return
+        new_score = game_state.paddle(scoring_side).score
 
-        # Check if a player won
+        # Check if a player won. The room has already stopped stepping (see
+        # GameLoop.score_goal), and the database work of end_game runs as its
+        # own task so it never holds up the shared tick.
         if new_score >= self.SCORE_TO_WIN:
-            await self.end_game(room_id, winner_side=scoring_side)
+            game_state.set_lifecycle(FINISHED)
+            self.checkpoints.discard(room_id)
+            task = asyncio.create_task(self.end_game(room_id, winner_side=scoring_side))
+            self.end_game_tasks.add(task)
+            task.add_done_callback(self.end_game_tasks.discard)
+        else:
+            self.checkpoints.mark(room_id)
 
     async def end_game(self, room_id, winner_side):
         """
         Handle game over: record match, notify players, update tournaments.
         """
-        await self.loops[room_id].stop()
-        logger.info(f"🏆 Game in room {room_id} is over! Winner: {winner_side}")
+        # Both may be reclaimed while this runs, e.g. when the players leave
         game_state = self.games.get(room_id)
+        loop = self.loops.get(room_id)
+        if game_state is None or loop is None:
+            return
+        await loop.stop()
+        logger.info(f"🏆 Game in room {room_id} is over! Winner: {winner_side}")
     
         # Fetch player data
-        player1_id = next((p['alias'] for p in game_state['players'].values() if p['side'] == 'left'), None)
-        player2_id = "Computer" if game_state['ai']['active'] else next(
-            (p['alias'] for p in game_state['players'].values() if p['side'] == 'right'), None
-        )
+        left_player = game_state.player_on('left')
+        right_player = game_state.player_on('right')
+        player1_id = left_player.alias if left_player else None
+        player2_id = "Computer" if game_state.ai.active else (right_player.alias if right_player else None)
     
         player1 = await self.get_user(player1_id) 
         player2 = await self.get_user(player2_id)
     
         winner = player1.username if winner_side == "left" else player2.username
-        loser = player1.username if winner_side == "right" else player2.username
     
         logger.info(f"🏆 The winner is: {winner}")
     
         # Tournament logic
-        tournament_id = game_state.get('tournament_id')
+        tournament_id = game_state.tournament_id
         if tournament_id:
-            tournament_result = await self.tournament_manager.advance_next_match(tournament_id, loser)
-            await self.notify_tournament_progress(room_id, winner, loser, tournament_result, game_state)
+            winner_player = game_state.player_on(winner_side)
+            await self.notify_tournament_progress(room_id, winner, winner_player.user_id if winner_player else None, game_state)
         else:
             # Regular game over message
             await self.channel_layer.group_send(
                 f"game_{room_id}",
-                {
-                    'type': 'game_message',
-                    'data': {
-                        'type': 'game_over',
-                        'message': f"Game Over! {winner} wins!",
-                        'winner': str(winner),
-                        'players': game_state['game_attributes'].get('users'),
-                    },
-                }
+                game_message({
+                    'type': 'game_over',
+                    'message': f"Game Over! {winner} wins!",
+                    'winner': str(winner),
+                    'players': game_state.game_attributes.get('users'),
+                })
             )
     
         # Record the match result
         try:
-            await sync_to_async(safe_record_match)(player1, player2, game_state['paddles']['left']['score'], game_state['paddles']['right']['score'])
+            await sync_to_async(safe_record_match)(player1, player2, game_state.left.score, game_state.right.score)
         except Exception as e:
             logger.error(f"Error recording match: {e}")
     
@@ -273,46 +456,44 @@ class GameManager:
             logger.error(f"User {identifier} not found.")
             return None
 
-    async def notify_tournament_progress(self, room_id, winner, loser, tournament_result, game_state):
-        tournament_id = game_state.get('tournament_id')
+    async def notify_tournament_progress(self, room_id, winner, winner_id, game_state):
+        """
+        Move the winner up the bracket and send everyone in the room a join
+        token for the winner's next match, to play or to watch it. Other
+        matches of the tournament go on meanwhile, see bracket.py.
+        """
+        tournament_id = game_state.tournament_id
         if not tournament_id:
             logger.info("tournament_id missing.")
             return
-        tournament_result = await self.tournament_manager.advance_next_match(tournament_id, loser)
-        logger.info(f"Tournament result: {tournament_result}")
+        try:
+            next_match = await self.tournament_manager.record_result(tournament_id, room_id, winner_id)
+        except ValueError as e:
+            logger.error(f"Could not record the result of room {room_id}: {e}")
+            return
         message = {
             'type': 'tournament',
             'winner': str(winner),
         }
-        if len(tournament_result) == 2:
-            logger.info(f"Tournament match finished, next up {tournament_result}")
-            data = game_state['game_attributes']
-            data.update({'next_players': [tournament_result[0], tournament_result[1]]})
-            for user_id in data.get('users'):
-                data.update({'user_id': user_id})
-                url = generate_shared_game_room_url(**data)
-                message.update({
-                    'next' : {
-                        'players': [tournament_result[0], tournament_result[1]],
-                        'url': url
-                }})
-                player_channel = self.get_player_channel(user_id)
-                await self.channel_layer.send(
-                    player_channel,
-                    {
-                        'type': 'game_message',
-                        'data': message,
-                    }
-                )
-        elif len(tournament_result) > 2 and tournament_result.isdigit():
+        if next_match is None:
             logger.info(f"Tournament finished, winner is {winner}")
-            await self.channel_layer.group_send(
-                f"game_{room_id}",
-                {
-                    'type': 'game_message',
-                    'data': message,
-                }
-            )
+            await self.broadcast_message(room_id, message)
+            return
+
+        logger.info(f"Tournament match {room_id} finished, {winner} plays next in {next_match.room_id}")
+        data = {key: value for key, value in game_state.game_attributes.items() if key not in ('exp', 'seed')}
+        data.update({'room_id': next_match.room_id, 'next_players': next_match.players})
+        for user_id in list(game_state.players) + list(game_state.spectators):
+            data.update({'user_id': user_id})
+            message.update({
+                'next': {
+                    'players': next_match.players,
+                    'round': next_match.round,
+                    'url': generate_shared_game_room_url(**data),
+            }})
+            player_channel = self.get_player_channel(user_id)
+            if player_channel:
+                await self.channel_layer.send(player_channel, game_message(message))
 
     def add_player_to_channel_map(self, player_id, channel_name):
         logger.info(f"user {player_id} adds channel {channel_name}")
@@ -325,133 +506,14 @@ class GameManager:
 
     def initial_game_state(self, **kwargs):
         logger.info("Called initial_game_state().")
-        game_type = kwargs.get('game_type')
-        room_id = kwargs.get('room_id')
-        tournament_id = kwargs.get('tournament_id')
-        users = kwargs.get('users')
-        room_size = len(users)
-        config = self.config
-        return {
-            'room_id': room_id,
-            'tournament_id': tournament_id,
-            'room_size': room_size,
-            'game_attributes': {**kwargs},
-            'players': {},
-            'spectators': {},
-            'ai' : { 'active': game_type == "PVC", 'since_last_update' : None, 'predicted_y': None},
-            'player_ai': {'input': {'up': False, 'down': False}},
-            'ball': {
-                'x': config['canvas']['width'] / 2,
-                'y': config['canvas']['height'] / 2,
-                'vx': config['ball']['speed'] * (-1 if random.random() < 0.5 else 1),
-                'vy': config['ball']['speed'] * (-1 if random.random() < 0.5 else 1),
-                'render': True
-            },
-            'paddles': {
-                'left': {
-                    'x': 0,
-                    'y': config['canvas']['height'] / 2 - 50,
-                    'score': 0,
-                },
-                'right': {
-                    'x': config['canvas']['width'] - config['paddle']['width'],
-                    'y': config['canvas']['height'] / 2 - 50,
-                    'score': 0,
-                },
-            },
-            'game_started': False,
-            'paused': False,
-        }
+        return RoomState(RoomConfig(self.config), **kwargs)
 
 
-
-class TournamentManager:
-    def __init__(self):
-        self.tournaments = {}  # In-memory tournament data
-
-    async def add(self, tournament_id, players):
-        # Initialize the tournament with all players active and waiting
-        logger.info(f"Tournament with id {tournament_id} has been added.")
-        self.tournaments[tournament_id] = {
-            str(player): {'is_active': True, 'is_waiting': True} for player in players
-        }
-
-    async def advance_next_match(self, tournament_id, loser=None):
-        tournament = self.tournaments.get(tournament_id)
-        if not tournament:
-            raise ValueError(f"Tournament {tournament_id} not found")
-        logger.info(f"Called advance_next_match() with tournament id: {tournament_id}")
-
-        # If a loser is provided, mark them as inactive
-        if loser:
-            if loser in tournament:
-                tournament[loser]['is_active'] = False
-                tournament[loser]['is_waiting'] = False
-            else:
-                raise ValueError(f"Loser {loser} not found in tournament {tournament_id}")
-        
-        # Find all active and waiting players
-        waiting_players = [player for player, status in tournament.items() if status['is_active'] and status['is_waiting']]
-        active_players = [player for player, status in tournament.items() if status['is_active']]
-
-        if len(waiting_players) >= 2:
-            # Select the first two waiting players for the next match
-            player1, player2 = waiting_players[:2]
-            tournament[player1]['is_waiting'] = False
-            tournament[player2]['is_waiting'] = False
-            return (player1, player2)  # Return the pair for the next match
-
-        elif len(active_players) == 1:
-            # Only one active player remains; they are the winner
-            winner = active_players[0]
-            return winner
-
-        elif len(waiting_players) == 0 and len(active_players) > 1:
-            # End of a round: Reset waiting status for the next round
-            for player in active_players:
-                tournament[player]['is_waiting'] = True
-            return await self.advance_next_match(tournament_id)
-
-        else:
-            # No more matches to play
-            return "Tournament has concluded or cannot progress"
-    
 def safe_record_match(player1, player2, score1, score2):
     try:
         record_match(player1, player2, score1, score2)
     except Exception as e:
         logger.error(f"Error recording match: {e}")
-    
-    
-"""
-Ana, Vin, Na, Kate
-    find_match? select players
-		-> Ana Vin is_waiting False
-Round 1
-	Match 1
-	Ana vs Vin
-		-> Ana Wins
-			-> Vin is_active False
-    find match? select players
-		-> NA Kate is waiting False
-	Match 2
-	-> Na Wins
-		-> Kate is_active False
-    find_match? select players
-		-> round ended
-			-> is_active?
-                Ana Na is_waiting True
-Round 2
-	find match? select palyers
-		-> Ana Na is_waiting False
-	Match 3
-    Ana vs Na 
-		-> Ana Wins
-			Na -> is_active False
-    find match? select players
-		-> all matches played
-			-> Ana is tournament winner
-"""
 
 
 game_manager = GameManager()
@@ -0,0 +1,214 @@
+"""
+Binary wire format for game state frames.
+
+Every frame is little-endian and starts with the same header:
+
+    offset  type    field
+    0       uint8   kind         1 = keyframe, 2 = delta
+    1       uint8   flags        bit0 ball.render, bit1 game_started, bit2 paused,
+                                 bit3 degraded (server is shedding load),
+                                 bits4-5 phase: 0 playing, 1 countdown,
+                                 2 serving, 3 over
+    2       uint32  tick         server simulation tick of the room
+    6       uint32  server_time  server monotonic clock in ms (wraps at 2**32)
+    10      uint16  mask         which fields follow (keyframes set every bit)
+
+The fields present in `mask` follow in bit order:
+
+    bit  type    field         encoding
+    0    uint16  ball.x        x / canvas_width * 65535, clamped to 0..1
+    1    uint16  ball.y        y / canvas_height * 65535, clamped to 0..1
+    2    int16   ball.vx       vx / canvas_width * 1000 (canvas widths/s)
+    3    int16   ball.vy       vy / canvas_height * 1000 (canvas heights/s)
+    4    uint16  left.y        y / canvas_height * 65535
+    5    uint16  right.y       y / canvas_height * 65535
+    6    uint8   left.score
+    7    uint8   right.score
+    8    uint16  left.seq      last input sequence applied to the left paddle
+    9    uint16  right.seq     last input sequence applied to the right paddle
+
+A delta only carries the fields whose quantized value changed since the
+previous frame, so a quiet frame is 16 bytes (header plus ball position).
+Clients must ignore deltas until they have seen a keyframe. Paddle x
+positions never change and are not sent. Player aliases are sent
+separately as a JSON `players` message when they change.
+
+Frames and JSON game messages are encoded once by the sender and shared by
+every member of the group (see game_message); consumers write them to the
+socket as they are.
+
+Clients estimate the offset to server_time with the `clock_sync` action on
+the game socket (see server_clock_ms) and use it to interpolate between
+frames, which arrive at the send rate rather than the tick rate.
+
+Inputs carry a client sequence number (`{"action": "input", "up", "down",
+"seq"}`, wrapping at 2**16). The seq fields let a client tell which of its
+inputs a frame already includes: it moves its own paddle locally right away
+and reconciles with the server's position once every input it sent is
+acknowledged, see frontend/prediction.js. The server never takes positions
+from clients.
+
+frontend/frameDecoder.js is the reference decoder.
+"""
+import json, struct, time
+
+KEYFRAME = 1
+DELTA = 2
+
+FLAG_BALL_RENDER = 1 << 0
+FLAG_GAME_STARTED = 1 << 1
+FLAG_PAUSED = 1 << 2
+FLAG_DEGRADED = 1 << 3
+PHASE_SHIFT = 4
+PHASES = {'playing': 0, 'countdown': 1, 'serving': 2, 'over': 3}
+
+HEADER = struct.Struct('<BBIIH')
+FIELDS = (
+    struct.Struct('<H'),  # ball.x
+    struct.Struct('<H'),  # ball.y
+    struct.Struct('<h'),  # ball.vx
+    struct.Struct('<h'),  # ball.vy
+    struct.Struct('<H'),  # left.y
+    struct.Struct('<H'),  # right.y
+    struct.Struct('<B'),  # left.score
+    struct.Struct('<B'),  # right.score
+    struct.Struct('<H'),  # left.seq
+    struct.Struct('<H'),  # right.seq
+)
+ALL_FIELDS = (1 << len(FIELDS)) - 1
+
+POSITION_SCALE = 65535
+VELOCITY_SCALE = 1000
+
+
+def server_clock_ms():
+    """
+    Monotonic server clock in milliseconds, as carried in frame headers.
+    """
+    return int(time.monotonic() * 1000) & 0xFFFFFFFF
+
+
+def game_message(data):
+    """
+    Channel layer message carrying `data` as JSON text, encoded here once
+    rather than by each consumer, see GameConsumer.game_message.
+    """
+    return {'type': 'game_message', 'text': json.dumps(data, separators=(',', ':'))}
+
+
+def quantize_position(value, extent):
+    return int(max(0.0, min(value / extent, 1.0)) * POSITION_SCALE + 0.5)
+
+
+def quantize_velocity(value, extent):
+    return max(-32768, min(int(round(value / extent * VELOCITY_SCALE)), 32767))
+
+
+class FrameEncoder:
+    def __init__(self, config, keyframe_interval=60):
+        self.canvas_width = config.canvas_width
+        self.canvas_height = config.canvas_height
+        self.keyframe_interval = keyframe_interval  # In frames, not ticks
+        self.frame_count = 0
+        self.last_values = None
+        self.last_players = None
+        self.next_keyframe = 0
+
+    def force_keyframe(self):
+        """
+        Make the next frame a keyframe and resend the player aliases, e.g.
+        when someone joins the room.
+        """
+        self.next_keyframe = self.frame_count
+        self.last_players = None
+
+    def quantize(self, packed):
+        """
+        Quantize the field values of RoomState.pack().
+        """
+        width = self.canvas_width
+        height = self.canvas_height
+        ball_x, ball_y, ball_vx, ball_vy, left_y, right_y, left_score, right_score, left_seq, right_seq = packed[:10]
+        return (
+            quantize_position(ball_x, width),
+            quantize_position(ball_y, height),
+            quantize_velocity(ball_vx, width),
+            quantize_velocity(ball_vy, height),
+            quantize_position(left_y, height),
+            quantize_position(right_y, height),
+            min(left_score, 255),
+            min(right_score, 255),
+            left_seq & 0xFFFF,
+            right_seq & 0xFFFF,
+        )
+
+    def encode(self, game_state, tick):
+        """
+        Encode the current state as a keyframe or a delta against the
+        previous frame. `tick` is the room's simulation tick.
+        """
+        packed = game_state.pack()
+        values = self.quantize(packed)
+        render, game_started, paused, degraded, phase = packed[10:]
+        flags = PHASES[phase] << PHASE_SHIFT
+        if render:
+            flags |= FLAG_BALL_RENDER
+        if game_started:
+            flags |= FLAG_GAME_STARTED
+        if paused:
+            flags |= FLAG_PAUSED
+        if degraded:
+            flags |= FLAG_DEGRADED
+
+        if self.last_values is None or self.frame_count >= self.next_keyframe:
+            kind = KEYFRAME
+            mask = ALL_FIELDS
+            self.next_keyframe = self.frame_count + self.keyframe_interval
+        else:
+            kind = DELTA
+            mask = 0
+            last = self.last_values
+            for bit, value in enumerate(values):
+                if value != last[bit]:
+                    mask |= 1 << bit
+
+        parts = [HEADER.pack(kind, flags, tick & 0xFFFFFFFF, server_clock_ms(), mask)]
+        for bit, field in enumerate(FIELDS):
+            if mask & (1 << bit):
+                parts.append(field.pack(values[bit]))
+
+        self.last_values = values
+        self.frame_count += 1
+        return b''.join(parts)
+
+    def players_changed(self, game_state):
+        """
+        Return {'left': alias, 'right': alias, 'ids': {'left': user_id,
+        'right': user_id}} if the players changed since the last call,
+        otherwise None. Clients find their own side by user id.
+        """
+        players = {'left': None, 'right': None, 'ids': {'left': None, 'right': None}}
+        for player in game_state.players.values():
+            players[player.side] = str(player.alias)
+            players['ids'][player.side] = str(player.user_id)
+        if game_state.ai.active:
+            players['right'] = "Computer"
+        if players == self.last_players:
+            return None
+        self.last_players = players
+        return players
+
+
+def decode_frame(frame, state=None):
+    """
+    Decode a frame into a dict of quantized field values, applying deltas on
+    top of `state`. Mirrors frontend/frameDecoder.js; used for debugging.
+    """
+    kind, flags, tick, server_time, mask = HEADER.unpack_from(frame, 0)
+    values = list(state['values']) if state else [0] * len(FIELDS)
+    offset = HEADER.size
+    for bit, field in enumerate(FIELDS):
+        if mask & (1 << bit):
+            values[bit] = field.unpack_from(frame, offset)[0]
+            offset += field.size
+    return {'kind': kind, 'flags': flags, 'tick': tick, 'server_time': server_time, 'values': values}
@@ -0,0 +1,251 @@
+"""
+Room ownership across game server nodes, so players of one room can land
+on any node behind the load balancer.
+
+Every room runs on exactly one node, its owner. Ownership is a lease in
+Redis, game:owner:<room_id>, holding the owner's node channel and expiring
+after `lease` seconds. The first consumer of a room on any node claims it
+(SET NX), later ones on the owner reuse its lease; the owner renews the leases of all its rooms in one transaction
+every third of the lease, only those it still holds.
+
+A consumer whose room is owned elsewhere joins through the owner: it sends
+a room.join to the owner's node channel, the owner adds the consumer's
+channel to the room group, so frames reach it through the channel layer,
+and adds the player. Its events go the same way as room.call messages,
+see GameManager.forward().
+
+When a node dies its leases run out. The renewal round of every node also
+checks the rooms it has remote consumers in; once their lease is gone or
+held by another node, those sockets are closed with DRAINING_CLOSE_CODE.
+The clients reconnect, the first one claims the room again and the room
+resumes from its checkpoint, see checkpoint.py. A node that finds one of
+its own leases taken over stops that room the same way.
+
+A single node (config 'nodes') owns every room: it takes no leases and
+runs neither task, and its channel stays None.
+"""
+import logging, asyncio
+
+from apps.game.checkpoint import DRAINING_CLOSE_CODE
+from apps.game.game_loop import player_group, spectator_group
+logger = logging.getLogger(__name__)
+
+OWNER_PREFIX = "game:owner:"
+
+# GameManager methods a node runs for consumers on other nodes
+FORWARDED = ('update_player_input', 'clock_sync', 'set_game_started', 'set_game_paused', 'remove_player')
+
+
+class RoomRegistry:
+    def __init__(self, manager, redis_client, lease=10, shared=True):
+        self.manager = manager
+        self.redis = redis_client
+        self.lease = lease  # Seconds a node owns a room without renewing
+        self.shared = shared  # Other nodes serve rooms too
+        self.channel = None  # This node's channel, set by start()
+        self.remote = {}  # {room_id: owner channel} of rooms with consumers here
+        self.remote_consumers = {}  # {room_id: {channel_name: consumer}}
+        self.forwarded = 0
+        self.received = 0
+        self.handed_over = 0
+        self.starting = asyncio.Lock()
+        self._task = None
+        self._receiver = None
+
+    async def start(self):
+        async with self.starting:
+            if self.channel is None:
+                self.channel = await self.manager.channel_layer.new_channel()
+                logger.info(f"Room registry started, node channel {self.channel}")
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self.run())
+            if self._receiver is None or self._receiver.done():
+                self._receiver = asyncio.create_task(self.receive())
+
+    async def owner(self, room_id):
+        """
+        The node channel of the room's owner, claiming the room for this
+        node if nobody holds it. Rooms running here keep their lease, the
+        renewal round extends it.
+        """
+        if not self.shared or room_id in self.manager.games:
+            return self.channel
+        await self.start()
+        return await asyncio.to_thread(self.claim, room_id)
+
+    def is_local(self, owner):
+        return owner == self.channel
+
+    async def join(self, consumer, owner):
+        """
+        Join a consumer to a room that runs on another node.
+        """
+        room_id = consumer.game_attributes['room_id']
+        self.remote[room_id] = owner
+        self.remote_consumers.setdefault(room_id, {})[consumer.channel_name] = consumer
+        await self.send(owner, {
+            'type': 'room.join',
+            'attributes': consumer.game_attributes,
+            'group': consumer.room_group_name,
+            'channel': consumer.channel_name,
+        })
+
+    async def leave(self, consumer):
+        """
+        Tell the owner a remote consumer left. Returns False if the
+        consumer's room runs here.
+        """
+        room_id = consumer.game_attributes['room_id']
+        consumers = self.remote_consumers.get(room_id)
+        if not consumers or consumers.pop(consumer.channel_name, None) is None:
+            return False
+        owner = self.remote[room_id]
+        if not consumers:
+            del self.remote_consumers[room_id]
+            del self.remote[room_id]
+        await self.send(owner, {
+            'type': 'room.leave',
+            'room_id': room_id,
+            'user_id': consumer.game_attributes['user_id'],
+            'group': consumer.room_group_name,
+            'channel': consumer.channel_name,
+        })
+        return True
+
+    async def send(self, owner, message):
+        self.forwarded += 1
+        await self.manager.channel_layer.send(owner, message)
+
+    async def receive(self):
+        """
+        Run what other nodes forward to the rooms of this one.
+        """
+        layer = self.manager.channel_layer
+        while True:
+            message = await layer.receive(self.channel)
+            self.received += 1
+            try:
+                await self.handle(message)
+            except Exception as e:
+                logger.error(f"Could not handle forwarded {message.get('type')}: {e}")
+
+    async def handle(self, message):
+        manager = self.manager
+        kind = message['type']
+        if kind == 'room.join':
+            await manager.channel_layer.group_add(message['group'], message['channel'])
+            await manager.add_player(**message['attributes'])
+        elif kind == 'room.leave':
+            await manager.channel_layer.group_discard(message['group'], message['channel'])
+            await manager.remove_player(message['room_id'], message['user_id'])
+        elif kind == 'room.call' and message['method'] in FORWARDED:
+            await getattr(manager, message['method'])(*message['args'])
+        else:
+            logger.warning(f"Ignored forwarded message {kind}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if self.manager.draining:
+                continue  # Leases lapse, other nodes take the rooms over
+            try:
+                await self.renew_round()
+            except Exception as e:
+                logger.error(f"Could not renew room leases: {e}")
+
+    async def renew_round(self):
+        local = list(self.manager.games)
+        remote = dict(self.remote)
+        owners, remote_owners = await asyncio.to_thread(self.renew, local, list(remote))
+        for room_id, owner in zip(local, owners):
+            if owner != self.channel and room_id in self.manager.games:
+                logger.warning(f"Room {room_id} is now owned by {owner}, stopping it here")
+                await self.close_local(room_id)
+                await self.manager.reclaim_room(room_id, "lease taken over", keep_checkpoint=True)
+        for room_id, owner in zip(remote, remote_owners):
+            if owner != remote[room_id]:
+                logger.warning(f"Owner of room {room_id} went away, sending its players to reconnect")
+                await self.close_remote(room_id)
+
+    async def close_local(self, room_id):
+        layer = self.manager.channel_layer
+        for group in (player_group(room_id), spectator_group(room_id)):
+            for channel in tuple(layer.groups.get(group, ())):
+                consumer = layer.consumers.get(channel)
+                if consumer is not None:
+                    await consumer.close(code=DRAINING_CLOSE_CODE)
+        self.handed_over += 1
+
+    async def close_remote(self, room_id):
+        consumers = self.remote_consumers.pop(room_id, {})
+        self.remote.pop(room_id, None)
+        for consumer in consumers.values():
+            await consumer.close(code=DRAINING_CLOSE_CODE)
+        self.handed_over += 1
+
+    async def release(self, room_ids):
+        """
+        Give up the leases of rooms this node no longer runs.
+        """
+        if self.channel is None or not room_ids:
+            return
+        try:
+            await asyncio.to_thread(self.delete, room_ids)
+        except Exception as e:
+            logger.error(f"Could not release room leases: {e}")
+
+    def claim(self, room_id):
+        """
+        Runs in a worker thread, like the rest below.
+        """
+        key = OWNER_PREFIX + str(room_id)
+        pipe = self.redis.pipeline()
+        pipe.set(key, self.channel, nx=True, px=int(self.lease * 1000))
+        pipe.get(key)
+        return pipe.execute()[-1]
+
+    def renew(self, local, remote):
+        """
+        Returns the owners of the local rooms after renewing their leases,
+        and the owners of the remote ones. Like delete(), a lease is only
+        extended while this node holds it; the keys are watched, so a round
+        that races a takeover runs again. A lapsed lease is claimed again.
+        """
+        lease = int(self.lease * 1000)
+        keys = [OWNER_PREFIX + str(room_id) for room_id in local]
+        remote_keys = [OWNER_PREFIX + str(room_id) for room_id in remote]
+        if not keys:
+            return [], self.redis.mget(remote_keys) if remote_keys else []
+
+        def extend(pipe):
+            owners = pipe.mget(keys)
+            remote_owners = pipe.mget(remote_keys) if remote_keys else []
+            pipe.multi()
+            for key, owner in zip(keys, owners):
+                if owner == self.channel:
+                    pipe.pexpire(key, lease)
+                elif owner is None:
+                    pipe.set(key, self.channel, nx=True, px=lease)
+            return [self.channel if owner is None else owner for owner in owners], remote_owners
+
+        return self.redis.transaction(extend, *keys, value_from_callable=True)
+
+    def delete(self, room_ids):
+        for room_id in room_ids:
+            key = OWNER_PREFIX + str(room_id)
+
+            def release(pipe):
+                if pipe.get(key) == self.channel:
+                    pipe.multi()
+                    pipe.delete(key)
+
+            self.redis.transaction(release, key)
+
+    def stats(self):
+        return {
+            'node': self.channel,
+            'remote_rooms': len(self.remote),
+            'forwarded': self.forwarded,
+            'received': self.received,
+            'handed_over': self.handed_over,
+        }
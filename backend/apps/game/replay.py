@@ -0,0 +1,136 @@
+"""
+Deterministic match replay from the files written by GameLoop.save_replay(),
+see input_log.py for the format.
+
+    cd backend && python -m apps.game.replay replays/<room_id>-<seed>.replay --step 5000
+"""
+import argparse, asyncio, time
+
+from apps.game.game_loop import GameLoop
+from apps.game.input_log import COUNTDOWN, AI_NORMAL, AI_REDUCED, REWIND, read_replay
+from apps.game.scheduler import TickScheduler
+from apps.game.state import RoomConfig, RoomState, PlayerState, OVER
+
+
+class ReplayManager:
+    """
+    The parts of GameManager a GameLoop needs, doing nothing.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.scheduler = TickScheduler(tick_rate=config['tick_rate'])
+        self.channel_layer = None
+
+    async def notify_score(self, room_id, scoring_side):
+        pass
+
+
+class ReplayLoop(GameLoop):
+    """
+    A GameLoop driven by an input log: no broadcasts and no watchdog.
+    """
+    async def end_tick(self):
+        pass
+
+
+class ReplayEngine:
+    """
+    Rebuilds a match from its replay. Steps run back to back without the
+    scheduler, so seeking is limited only by CPU. Seeking backwards starts
+    over from the first step.
+    """
+    def __init__(self, header, entries):
+        self.header = header
+        self.entries = entries
+        self.config = header['config']
+        self.dt = 1.0 / self.config['tick_rate']
+        self.reset()
+
+    @classmethod
+    def load(cls, path):
+        return cls(*read_replay(path))
+
+    def reset(self):
+        header = self.header
+        game_state = RoomState(
+            RoomConfig(self.config),
+            room_id=header['room_id'],
+            game_type=header['game_type'],
+            users=header['users'],
+            seed=header['seed'],
+            ai_difficulty=header.get('ai_difficulty'),
+        )
+        self.sides = {}
+        for side, user_id in header['players'].items():
+            player = PlayerState(user_id, side)
+            game_state.players[user_id] = player
+            self.sides[side] = player
+        game_state.game_started = True
+        self.loop = ReplayLoop(header['room_id'], ReplayManager(self.config), game_state)
+        self.loop.running = True
+        self.cursor = 0
+        self.rewind = 0  # Steps the next input was rewound
+
+    @property
+    def step(self):
+        return self.loop.step_count
+
+    def apply(self, entry):
+        loop = self.loop
+        code = entry & 0xF
+        if code < COUNTDOWN:
+            player = self.sides.get('left' if code < 4 else 'right')
+            if player:
+                player.up = bool(code & 2)
+                player.down = bool(code & 1)
+                loop.lag.apply(loop, player, self.rewind)
+            self.rewind = 0
+        elif code == COUNTDOWN:
+            loop.start_countdown()
+        elif code in (AI_NORMAL, AI_REDUCED):
+            loop.ai_interval = max(1, loop.config.tick_rate // 10) if code == AI_REDUCED else 1
+        elif code == REWIND:
+            self.rewind = entry >> 4
+
+    async def run_to(self, step):
+        """
+        Advance to just after `step` steps and return the room state.
+        """
+        step = min(step, self.header['steps'])
+        if step < self.step:
+            self.reset()
+        entries = self.entries
+        loop = self.loop
+        while loop.step_count < step:
+            while self.cursor < len(entries) and entries[self.cursor] >> 4 <= loop.step_count:
+                self.apply(entries[self.cursor])
+                self.cursor += 1
+            if loop.game_state.phase == OVER:
+                break
+            loop.step_count += 1
+            loop.advance_phase()
+            await loop.update_game_state(self.dt)
+        return loop.game_state
+
+    def state_at(self, step):
+        return asyncio.run(self.run_to(step))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--step', type=int, help="Step to stop at, defaults to the end of the match")
+    args = parser.parse_args()
+    engine = ReplayEngine.load(args.path)
+    header = engine.header
+    step = header['steps'] if args.step is None else args.step
+    start = time.perf_counter()
+    game_state = engine.state_at(step)
+    elapsed = time.perf_counter() - start
+    print(f"room {header['room_id']}: {len(engine.entries)} entries, {header['steps']} steps, recorded score {header['score']}")
+    print(f"replayed {engine.step} steps in {elapsed * 1000:.1f} ms ({engine.step * engine.dt / max(elapsed, 1e-9):.0f}x real time)")
+    print(game_state)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,22 @@
 from django.urls import re_path
 from .consumer import GameConsumer
+from .manager import game_manager
 
 websocket_urlpatterns = [
     re_path(r'ws/game/join$', GameConsumer.as_asgi()),
 ]
+
+
+async def lifespan(scope, receive, send):
+    """
+    ASGI lifespan app: starts the game manager's background work with the
+    server, see GameManager.start().
+    """
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            game_manager.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
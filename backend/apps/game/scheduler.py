@@ -0,0 +1,159 @@
+import logging, asyncio, time
+
+from apps.game.state import RoomConfig
+logger = logging.getLogger(__name__)
+
+
+class TickScheduler:
+    def __init__(self, tick_rate=60, max_catch_up=5):
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate
+        self.max_catch_up = max_catch_up  # Max ticks run back to back when we fall behind
+        self.loops = {}  # {room_id: GameLoop}
+        self.parked = {}  # {room_id: GameLoop} not simulating, waiting for an event
+        self.tick_count = 0
+        self.skipped_ticks = 0
+        self.tick_started = None
+        self.tick_ended = None
+        self.last_tick_duration = 0.0
+        self.behind = False  # True while ticks run late against their deadlines
+        self.engine = None  # Optional batched physics engine, see batch_physics.py
+        self.ai = None  # Optional batched AI paddles, see ai.py
+        self._task = None
+
+    def use_engines(self, config):
+        """
+        Set up the batched engines a manager config asks for.
+        """
+        if config['physics_engine'] == 'numpy':
+            if config['collision_mode'] != 'discrete':
+                raise ValueError("The numpy physics engine only supports discrete collisions")
+            from apps.game.batch_physics import BatchPhysics
+            self.engine = BatchPhysics(RoomConfig(config))
+        if config['ai_engine'] == 'numpy':
+            if self.engine is None:
+                raise ValueError("The numpy AI engine needs the numpy physics engine")
+            from apps.game.ai import AIController
+            self.ai = AIController(RoomConfig(config), self.engine)
+
+    def register(self, loop):
+        """
+        Add a GameLoop to the shared tick. Starts the scheduler task if needed.
+        """
+        self.parked.pop(loop.room_id, None)
+        self.loops[loop.room_id] = loop
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            logger.info(f"Tick scheduler started at {self.tick_rate} Hz")
+
+    def unregister(self, room_id):
+        """
+        Remove a GameLoop from the shared tick. The scheduler stops once empty.
+        """
+        loop = self.loops.pop(room_id, None)
+        parked = self.parked.pop(room_id, None)
+        if self.engine is not None and (loop or parked):
+            self.engine.detach(loop or parked)
+
+    def park(self, loop):
+        """
+        Take a loop off the tick until it is registered again. Parked rooms
+        cost nothing per tick, and the scheduler task stops when every room
+        is parked.
+        """
+        if self.loops.pop(loop.room_id, None) is not None:
+            self.parked[loop.room_id] = loop
+
+    def stats(self):
+        return {'ticking': len(self.loops), 'parked': len(self.parked), 'skipped_ticks': self.skipped_ticks}
+
+    async def run(self):
+        """
+        Fixed timestep loop. Deadlines advance by exactly dt, so the time a
+        tick takes is not added on top of the sleep. If we fall more than
+        max_catch_up ticks behind, the backlog is dropped instead of replayed.
+        """
+        clock = time.perf_counter
+        next_tick = clock() + self.dt
+        while self.loops:
+            delay = next_tick - clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            due = int((clock() - next_tick) / self.dt) + 1
+            steps = min(due, self.max_catch_up)
+            self.behind = due > 1
+            for _ in range(steps):
+                await self.tick()
+            next_tick += due * self.dt
+
+            if due > steps:
+                self.skipped_ticks += due - steps
+                logger.warning(f"Tick scheduler fell behind, skipped {due - steps} ticks")
+        logger.info("Tick scheduler stopped, no rooms registered")
+
+    async def tick(self):
+        """
+        Advance every registered loop by one timestep.
+        """
+        clock = time.perf_counter
+        self.tick_started = clock()
+        loops = list(self.loops.values())
+        if loops:
+            if self.engine is None and self.ai is None:
+                await asyncio.gather(*(loop.tick(self.dt) for loop in loops))
+            else:
+                await self.batch_tick(loops)
+        self.tick_ended = clock()
+        self.last_tick_duration = self.tick_ended - self.tick_started
+        self.tick_count += 1
+
+    async def batch_tick(self, loops):
+        """
+        Tick in phases so the batched parts see every room at once: every
+        loop applies its events, the rooms step their physics (all at once
+        with the batched engine), the AI paddles move, then each loop
+        broadcasts.
+        """
+        # Only broadcasting waits on I/O; the other phases are awaited in
+        # turn, which costs far less than a task per room.
+        loops = [loop for loop in loops if await loop.begin_tick()]
+        if not loops:
+            return
+
+        if self.engine is None:
+            for loop in loops:
+                await loop.simulate(self.dt)
+        else:
+            start = time.perf_counter()
+            left_goals, right_goals = self.engine.step(loops, self.dt)
+            self.share_work(loops, time.perf_counter() - start)
+            for index in left_goals:
+                await loops[index].batch_tick('left')
+            for index in right_goals:
+                await loops[index].batch_tick('right')
+            self.engine.record(loops)
+
+        ai_loops = [loop for loop in loops if loop.game_state.ai.active]
+        if ai_loops:
+            start = time.perf_counter()
+            try:
+                if self.ai is None:
+                    for loop in ai_loops:
+                        loop.touch_physics()
+                        loop.update_ai_paddle(self.dt)
+                else:
+                    self.ai.step(ai_loops, self.dt)
+            except Exception as e:
+                logger.error(f"Error moving AI paddles: {e}")
+            self.share_work(ai_loops, time.perf_counter() - start)
+
+        await asyncio.gather(*(loop.finish_tick() for loop in loops))
+
+    def share_work(self, loops, duration):
+        """
+        Count a batched pass against each room's tick budget.
+        """
+        share = duration / len(loops)
+        for loop in loops:
+            loop.tick_work += share
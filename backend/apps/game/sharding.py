@@ -0,0 +1,308 @@
+"""
+Sharded mode: rooms run in a pool of worker processes instead of the
+Daphne process, so game capacity grows with the number of cores.
+
+GameManager keeps a mirror RoomState per room for membership and scores,
+and a RemoteLoop in place of each GameLoop. The room's real GameLoop runs
+in the shard picked by hashing its room_id. Each shard has its own
+TickScheduler and talks to the parent over one pipe:
+
+    parent -> shard   ('create', room_id, kwargs)
+                      ('event', room_id, event)        mailbox events
+                      ('join', room_id, user_id, side) side None for spectators
+                      ('leave', room_id, user_id)
+                      ('keyframe', room_id, spectators)
+                      ('stop', room_id)
+                      ('shutdown',)
+    shard -> parent   ('group_send', group, message)   frames and game messages
+                      ('send', channel, message)
+                      ('score', room_id, side, left_score, right_score)
+
+Messages are sent in batches, one pipe write per event loop iteration, so a
+shard writes once per tick however many rooms it runs. Goals are reported
+to the parent, which decides when the game ends; the database and the
+channel layer are only used by the parent.
+
+Rooms running in shards are not checkpointed (see checkpoint.py): the
+parent has no simulation state to snapshot, so they do not survive a
+reload or a drain, and GameManager never resumes a room from a checkpoint
+in sharded mode.
+"""
+import logging, asyncio, multiprocessing, zlib
+
+from apps.game.game_loop import GameLoop
+from apps.game.scheduler import TickScheduler
+from apps.game.state import RoomConfig, RoomState, PlayerState
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Buffers messages for a pipe and sends them as one batch per event loop
+    iteration.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.pending = []
+
+    def put(self, message):
+        if not self.pending:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self.pending.append(message)
+
+    def flush(self):
+        batch, self.pending = self.pending, []
+        try:
+            self.conn.send(batch)
+        except (BrokenPipeError, OSError) as e:
+            logger.error(f"Could not send {len(batch)} messages to shard pipe: {e}")
+
+
+def receive(conn, queue):
+    """
+    Reader callback: move every batch waiting on the pipe into `queue`.
+    Puts None once the other end has closed.
+    """
+    try:
+        while conn.poll():
+            for message in conn.recv():
+                queue.put_nowait(message)
+    except (EOFError, OSError):
+        asyncio.get_running_loop().remove_reader(conn.fileno())
+        queue.put_nowait(None)
+
+
+class ShardChannelLayer:
+    """
+    The channel layer as seen by GameLoops inside a shard.
+    """
+    def __init__(self, outbox):
+        self.outbox = outbox
+
+    async def group_send(self, group, message):
+        self.outbox.put(('group_send', group, message))
+
+    async def send(self, channel, message):
+        self.outbox.put(('send', channel, message))
+
+
+class Shard:
+    """
+    Runs inside a worker process and plays the part of GameManager for the
+    GameLoops of its rooms.
+    """
+    def __init__(self, index, conn, config):
+        self.index = index
+        self.conn = conn
+        self.config = config
+        self.room_config = RoomConfig(config)
+        self.loops = {}  # {room_id: GameLoop}
+        self.outbox = Outbox(conn)
+        self.channel_layer = ShardChannelLayer(self.outbox)
+        self.scheduler = TickScheduler(tick_rate=config['tick_rate'])
+        self.scheduler.use_engines(config)
+
+    async def serve(self):
+        commands = asyncio.Queue()
+        asyncio.get_running_loop().add_reader(self.conn.fileno(), receive, self.conn, commands)
+        logger.info(f"Game shard {self.index} started")
+        while True:
+            command = await commands.get()
+            if command is None or command[0] == 'shutdown':
+                break
+            try:
+                await self.handle(command)
+            except Exception as e:
+                logger.error(f"Game shard {self.index} failed to handle {command[0]}: {e}")
+        for loop in list(self.loops.values()):
+            await loop.stop()
+        logger.info(f"Game shard {self.index} stopped")
+
+    async def handle(self, command):
+        kind, room_id = command[0], command[1]
+        if kind == 'create':
+            if room_id not in self.loops:
+                loop = GameLoop(room_id, self, RoomState(self.room_config, **command[2]))
+                self.loops[room_id] = loop
+                await loop.start()
+            return
+
+        loop = self.loops.get(room_id)
+        if loop is None:
+            return
+        if kind == 'event':
+            loop.mailbox.put(command[2])
+        elif kind == 'join':
+            user_id, side = command[2], command[3]
+            if side:
+                loop.game_state.players[user_id] = PlayerState(user_id, side)
+            else:
+                loop.game_state.spectators[user_id] = PlayerState(user_id)
+        elif kind == 'leave':
+            loop.touch_physics()
+            loop.game_state.players.pop(command[2], None)
+            loop.game_state.spectators.pop(command[2], None)
+        elif kind == 'keyframe':
+            encoder = loop.spectator_encoder if command[2] else loop.encoder
+            encoder.force_keyframe()
+        elif kind == 'stop':
+            await loop.stop()
+            del self.loops[room_id]
+
+    async def notify_score(self, room_id, scoring_side):
+        game_state = self.loops[room_id].game_state
+        self.outbox.put(('score', room_id, scoring_side, game_state.left.score, game_state.right.score))
+
+
+def run_shard(index, conn, config):
+    """
+    Entry point of a shard process.
+    """
+    logging.basicConfig(level=logging.INFO, format=f"[shard {index}] %(levelname)s %(name)s: %(message)s")
+    asyncio.run(Shard(index, conn, config).serve())
+
+
+class RemoteMailbox:
+    def __init__(self, pool, room_id):
+        self.pool = pool
+        self.room_id = room_id
+
+    def put(self, event):
+        self.pool.send(self.room_id, ('event', self.room_id, event))
+        return True
+
+    def stats(self):
+        return {}
+
+
+class RemoteEncoder:
+    def __init__(self, pool, room_id, spectators=False):
+        self.pool = pool
+        self.room_id = room_id
+        self.spectators = spectators
+
+    def force_keyframe(self):
+        self.pool.send(self.room_id, ('keyframe', self.room_id, self.spectators))
+
+
+class RemoteLoop:
+    """
+    Stands in for a GameLoop that runs in a shard. `game_state` is the
+    parent's mirror of the room: membership as set by GameManager and scores
+    as reported by the shard.
+    """
+    def __init__(self, room_id, pool, game_state, kwargs):
+        self.room_id = room_id
+        self.pool = pool
+        self.game_state = game_state
+        self.kwargs = kwargs
+        self.mailbox = RemoteMailbox(pool, room_id)
+        self.encoder = RemoteEncoder(pool, room_id)
+        self.spectator_encoder = RemoteEncoder(pool, room_id, spectators=True)
+        self.running = False
+
+    async def start(self):
+        self.running = True
+        self.pool.send(self.room_id, ('create', self.room_id, self.kwargs))
+        logger.info(f"Game loop for room {self.room_id} started on shard {self.pool.shard_for(self.room_id)}")
+
+    async def stop(self, replay=True):
+        if self.running:
+            self.running = False
+            self.pool.send(self.room_id, ('stop', self.room_id))
+
+    def touch_physics(self):
+        pass  # The shard's own loop does this, see Shard.handle()
+
+
+class ShardPool:
+    def __init__(self, manager, size):
+        self.manager = manager
+        self.size = size
+        self.processes = []
+        self.outboxes = []
+        self.forwarders = []
+        self.score_tasks = set()  # Keeps running score tasks referenced
+
+    def start(self):
+        """
+        Spawn the shard processes. Called on first use, from the event loop.
+        """
+        context = multiprocessing.get_context('spawn')
+        for index in range(self.size):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=run_shard,
+                args=(index, child_conn, self.manager.config),
+                name=f"game-shard-{index}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            messages = asyncio.Queue()
+            asyncio.get_running_loop().add_reader(parent_conn.fileno(), receive, parent_conn, messages)
+            self.processes.append(process)
+            self.outboxes.append(Outbox(parent_conn))
+            self.forwarders.append(asyncio.create_task(self.forward(index, messages)))
+        logger.info(f"Started {self.size} game shards")
+
+    def shard_for(self, room_id):
+        # crc32 rather than hash(), which is salted per process
+        return zlib.crc32(str(room_id).encode()) % self.size
+
+    def send(self, room_id, message):
+        if not self.processes:
+            self.start()
+        self.outboxes[self.shard_for(room_id)].put(message)
+
+    def create_loop(self, room_id, game_state, kwargs):
+        return RemoteLoop(room_id, self, game_state, dict(kwargs, seed=game_state.seed))
+
+    def join(self, room_id, user_id, side=None):
+        self.send(room_id, ('join', room_id, user_id, side))
+
+    def leave(self, room_id, user_id):
+        self.send(room_id, ('leave', room_id, user_id))
+
+    async def forward(self, index, messages):
+        """
+        Pass a shard's messages on, in order, to the channel layer and the
+        manager.
+        """
+        channel_layer = self.manager.channel_layer
+        while True:
+            message = await messages.get()
+            if message is None:
+                logger.error(f"Game shard {index} exited, its rooms are lost")
+                return
+            kind = message[0]
+            try:
+                if kind == 'group_send':
+                    await channel_layer.group_send(message[1], message[2])
+                elif kind == 'send':
+                    await channel_layer.send(message[1], message[2])
+                elif kind == 'score':
+                    # Own task, so ending the game does not hold up frames
+                    task = asyncio.create_task(self.score(*message[1:]))
+                    self.score_tasks.add(task)
+                    task.add_done_callback(self.score_tasks.discard)
+            except Exception as e:
+                logger.error(f"Error forwarding {kind} from game shard {index}: {e}")
+
+    async def score(self, room_id, scoring_side, left_score, right_score):
+        game_state = self.manager.games.get(room_id)
+        if game_state is None:
+            return
+        game_state.left.score = left_score
+        game_state.right.score = right_score
+        try:
+            await self.manager.notify_score(room_id, scoring_side)
+        except Exception as e:
+            logger.error(f"Error handling a goal in room {room_id} from its shard: {e}")
+
+    def shutdown(self):
+        for outbox in self.outboxes:
+            outbox.pending.append(('shutdown',))
+            outbox.flush()
+        for process in self.processes:
+            process.join(timeout=5)
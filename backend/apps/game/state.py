@@ -0,0 +1,297 @@
+import random, time
+
+# Phases of a started room. Countdown and serving hide the ball until
+# RoomState.phase_ends, counted in simulation steps; over stops the physics.
+PLAYING = 'playing'
+COUNTDOWN = 'countdown'
+SERVING = 'serving'
+OVER = 'over'
+
+# Lifecycle of a room as seen by GameManager, see sweeper.py. Waiting until
+# a player is ready, active until the game is won, then finished until the
+# room is reclaimed.
+WAITING = 'waiting'
+ACTIVE = 'active'
+FINISHED = 'finished'
+
+
+def default_config(**overrides):
+    """
+    The game config of GameManager, with `overrides` applied. Kept free of
+    Django so the headless harness runs on the same one, see headless.py.
+    """
+    config = {
+        'canvas': {'width': 800, 'height': 600},
+        'paddle': {
+            'height': int(600 * 0.2),
+            'width': int(800 * 0.02)
+        },
+        'ball': {
+            'diameter': int(800 * 0.03),
+            'speed': 350
+        },
+        'tick_rate': 60,  # Physics steps per second, independent of send_rate
+        'send_rate': 30,  # State frames sent per second
+        'spectator_send_rate': 10,  # State frames per second for tournament spectators
+        'spectator_keyframes_only': False,  # Send spectators full frames only, no deltas
+        'physics_engine': 'python',  # 'python' steps each room on its own, 'numpy' batches all rooms
+        'collision_mode': 'discrete',  # 'discrete' checks overlap per tick, 'swept' solves time of impact
+        'ai_engine': 'python',  # 'python' moves each AI paddle on its own, 'numpy' all in one pass (needs the numpy physics engine)
+        'ai_difficulty': 'normal',  # AI profile of PVC rooms that do not name one, see state.AI_PROFILES
+        'tick_budget_ms': 0.5,  # Time one room's tick may take before the watchdog steps it down
+        'shards': 0,  # Worker processes to run rooms in, 0 runs every room in this process (sharded rooms are not checkpointed)
+        'score_to_win': 2,
+        'countdown_seconds': 0,  # Ball stays hidden this long once everyone is ready, 0 starts right away
+        'serve_delay_seconds': 1,  # Pause before the ball comes back after a goal
+        'max_rewind_ms': 150,  # How late an input can still move its paddle in the past, see lag.py
+        'replay_dir': None,  # Where finished matches save their input log, None saves none
+        'replay_keep': 1000,  # Newest replays kept in replay_dir, older ones are deleted
+        'sweep_interval_seconds': 30,  # How often the sweeper looks for rooms to reclaim
+        'idle_timeout_seconds': 600,  # Rooms that get no event for this long are reclaimed
+        'finished_grace_seconds': 60,  # Finished rooms are kept this long for late messages
+        'tournament_timeout_seconds': 1800,  # Tournaments without a room or a change for this long are dropped
+        'checkpoint_interval_seconds': 1,  # How often live rooms are checkpointed to Redis
+        'checkpoint_ttl_seconds': 300,  # How long a room can be resumed after its last checkpoint
+        'nodes': 1,  # Game server processes behind the load balancer, one runs every room without leases
+        'lease_seconds': 10,  # How long a node owns its rooms without renewing, see registry.py
+    }
+    config.update(overrides)
+    return config
+
+
+class AIProfile:
+    """
+    How well the computer plays: how long it keeps going for its old target
+    after the ball changes course, how often and how far off its aim is,
+    and its paddle speed as a fraction of a player's.
+    """
+    __slots__ = ('name', 'reaction', 'error_chance', 'error_spread', 'speed')
+
+    def __init__(self, name, reaction, error_chance, error_spread, speed):
+        self.name = name
+        self.reaction = reaction  # Seconds
+        self.error_chance = error_chance
+        self.error_spread = error_spread  # Pixels either way
+        self.speed = speed
+
+
+AI_PROFILES = {
+    'easy': AIProfile('easy', reaction=0.3, error_chance=0.8, error_spread=150, speed=0.6),
+    'normal': AIProfile('normal', reaction=0.0, error_chance=0.6, error_spread=100, speed=1.0),
+    'hard': AIProfile('hard', reaction=0.0, error_chance=0.3, error_spread=40, speed=1.0),
+}
+
+
+class RoomConfig:
+    """
+    Game constants of a room, resolved once from GameManager.config so the
+    tick does not walk the nested config dict.
+    """
+    __slots__ = (
+        'canvas_width', 'canvas_height', 'paddle_width', 'paddle_height',
+        'ball_diameter', 'ball_radius', 'ball_speed', 'paddle_speed',
+        'max_paddle_y', 'right_paddle_x', 'speedup_factor', 'collision_mode',
+        'tick_rate', 'send_rate', 'spectator_send_rate', 'spectator_keyframes_only',
+        'tick_budget', 'score_to_win', 'countdown', 'serve_delay', 'ai_difficulty', 'max_rewind',
+    )
+
+    def __init__(self, config):
+        self.canvas_width = config['canvas']['width']
+        self.canvas_height = config['canvas']['height']
+        self.paddle_width = config['paddle']['width']
+        self.paddle_height = config['paddle']['height']
+        self.ball_diameter = config['ball']['diameter']
+        self.ball_radius = config['ball']['diameter'] / 2
+        self.ball_speed = config['ball']['speed']
+        self.paddle_speed = 550
+        self.max_paddle_y = self.canvas_height - self.paddle_height
+        self.right_paddle_x = self.canvas_width - self.paddle_width
+        self.speedup_factor = 1.05  # Applied to the ball speed on every wall and paddle hit
+        self.collision_mode = config.get('collision_mode', 'discrete')
+        self.tick_rate = config['tick_rate']
+        self.send_rate = config['send_rate']
+        self.spectator_send_rate = config.get('spectator_send_rate', self.send_rate)
+        self.spectator_keyframes_only = config.get('spectator_keyframes_only', False)
+        self.tick_budget = config.get('tick_budget_ms', 0.5) / 1000  # Seconds
+        self.score_to_win = config.get('score_to_win', 2)
+        # In ticks, so pauses and replays do not depend on the wall clock
+        self.countdown = round(config.get('countdown_seconds', 0) * self.tick_rate)
+        self.serve_delay = round(config.get('serve_delay_seconds', 1) * self.tick_rate)
+        self.ai_difficulty = config.get('ai_difficulty', 'normal')  # Unless the room asks for another
+        # Steps a late input can be rewound, see lag.py
+        self.max_rewind = round(config.get('max_rewind_ms', 0) * self.tick_rate / 1000)
+
+
+class BallState:
+    __slots__ = ('x', 'y', 'vx', 'vy', 'render')
+
+    def __init__(self, x, y, vx, vy):
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.render = True
+
+    def to_dict(self):
+        return {'x': self.x, 'y': self.y, 'vx': self.vx, 'vy': self.vy, 'render': self.render}
+
+
+class PaddleState:
+    __slots__ = ('x', 'y', 'score', 'seq')
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.score = 0
+        self.seq = 0  # Last client input sequence applied to this paddle
+
+    def to_dict(self):
+        return {'x': self.x, 'y': self.y, 'score': self.score, 'seq': self.seq}
+
+
+class PlayerState:
+    """
+    A user in the room. Spectators use the same class with side None.
+    """
+    __slots__ = ('user_id', 'side', 'alias', 'up', 'down', 'ready')
+
+    def __init__(self, user_id, side=None):
+        self.user_id = user_id
+        self.side = side
+        self.alias = user_id
+        self.up = False
+        self.down = False
+        self.ready = False
+
+    def to_dict(self):
+        return {
+            'side': self.side,
+            'alias': self.alias,
+            'input': {'up': self.up, 'down': self.down},
+            'ready': self.ready,
+        }
+
+
+class AIState:
+    __slots__ = (
+        'active', 'profile', 'reaction_steps', 'trajectory', 'predicted_y',
+        'next_y', 'react_at', 'up', 'down', 'rng',
+    )
+
+    def __init__(self, active, seed, profile, tick_rate):
+        self.active = active
+        self.profile = profile
+        self.reaction_steps = round(profile.reaction * tick_rate)
+        self.trajectory = None  # Ball velocity the cached prediction was made for
+        self.predicted_y = None  # Target the paddle follows
+        self.next_y = None  # Newer target, followed from step react_at
+        self.react_at = None
+        self.up = False
+        self.down = False
+        self.rng = random.Random(seed) if active else None  # Prediction noise only
+
+    def to_dict(self):
+        return {
+            'active': self.active,
+            'profile': self.profile.name,
+            'trajectory': self.trajectory,
+            'predicted_y': self.predicted_y,
+            'input': {'up': self.up, 'down': self.down},
+        }
+
+
+class RoomState:
+    __slots__ = (
+        'room_id', 'tournament_id', 'room_size', 'game_attributes', 'config',
+        'seed', 'serves', 'players', 'spectators', 'ai', 'ball', 'left', 'right',
+        'game_started', 'paused', 'degraded', 'phase', 'phase_ends',
+        'lifecycle', 'lifecycle_since', 'last_event',
+    )
+
+    def __init__(self, config, **kwargs):
+        self.room_id = kwargs.get('room_id')
+        self.tournament_id = kwargs.get('tournament_id')
+        self.room_size = len(kwargs.get('next_players') or kwargs.get('users'))  # Players the match needs
+        self.game_attributes = {**kwargs}
+        self.config = config
+        self.seed = kwargs.get('seed', random.getrandbits(32))
+        self.serves = 0
+        self.players = {}  # {user_id: PlayerState}
+        self.spectators = {}  # {user_id: PlayerState}
+        profile = AI_PROFILES.get(kwargs.get('ai_difficulty') or config.ai_difficulty, AI_PROFILES['normal'])
+        self.ai = AIState(kwargs.get('game_type') == "PVC", self.seed, profile, config.tick_rate)
+        x_sign, y_sign = self.serve_signs()
+        self.ball = BallState(
+            config.canvas_width / 2,
+            config.canvas_height / 2,
+            config.ball_speed * x_sign,
+            config.ball_speed * y_sign,
+        )
+        self.left = PaddleState(0, config.canvas_height / 2 - 50)
+        self.right = PaddleState(config.right_paddle_x, config.canvas_height / 2 - 50)
+        self.game_started = False
+        self.paused = False
+        self.degraded = False  # Set by the tick watchdog, see watchdog.py
+        self.phase = PLAYING
+        self.phase_ends = 0  # Step at which a countdown or serve ends
+        self.lifecycle = WAITING
+        self.lifecycle_since = self.last_event = time.monotonic()
+
+    def set_lifecycle(self, lifecycle):
+        if lifecycle != self.lifecycle:
+            self.lifecycle = lifecycle
+            self.lifecycle_since = time.monotonic()
+
+    def serve_signs(self):
+        """
+        Random (x, y) direction signs for the next serve. Drawn from the room
+        seed and the serve number, so a replay gets the same serves.
+        """
+        bits = random.Random(f"{self.seed}:{self.serves}").getrandbits(2)
+        self.serves += 1
+        return (-1 if bits & 1 else 1), (-1 if bits & 2 else 1)
+
+    def paddle(self, side):
+        return self.left if side == 'left' else self.right
+
+    def player_on(self, side):
+        return next((p for p in self.players.values() if p.side == side), None)
+
+    def pack(self):
+        """
+        Flat tuple of everything a state frame carries, see protocol.py.
+        """
+        ball = self.ball
+        return (
+            ball.x, ball.y, ball.vx, ball.vy,
+            self.left.y, self.right.y, self.left.score, self.right.score,
+            self.left.seq, self.right.seq,
+            ball.render, self.game_started, self.paused, self.degraded, self.phase,
+        )
+
+    def to_dict(self):
+        """
+        Full nested dict of the room, for logging and debugging.
+        """
+        return {
+            'room_id': self.room_id,
+            'tournament_id': self.tournament_id,
+            'room_size': self.room_size,
+            'seed': self.seed,
+            'serves': self.serves,
+            'game_attributes': self.game_attributes,
+            'players': {user_id: p.to_dict() for user_id, p in self.players.items()},
+            'spectators': {user_id: s.to_dict() for user_id, s in self.spectators.items()},
+            'ai': self.ai.to_dict(),
+            'ball': self.ball.to_dict(),
+            'paddles': {'left': self.left.to_dict(), 'right': self.right.to_dict()},
+            'game_started': self.game_started,
+            'paused': self.paused,
+            'degraded': self.degraded,
+            'phase': self.phase,
+            'phase_ends': self.phase_ends,
+            'lifecycle': self.lifecycle,
+        }
+
+    def __repr__(self):
+        return f"RoomState({self.to_dict()})"
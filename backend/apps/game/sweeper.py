@@ -0,0 +1,108 @@
+import logging, asyncio, time
+
+from apps.game.state import FINISHED
+logger = logging.getLogger(__name__)
+
+
+class RoomSweeper:
+    """
+    Periodically reclaims what GameManager no longer needs: finished rooms
+    once clients had time to get the result, rooms nobody sent an event to
+    for idle_timeout, loops and locks left without a room, and tournaments
+    no room refers to any more.
+    """
+    def __init__(self, manager, interval=30, idle_timeout=600, finished_grace=60, tournament_timeout=1800):
+        self.manager = manager
+        self.interval = interval  # Seconds between sweeps
+        self.idle_timeout = idle_timeout
+        self.finished_grace = finished_grace
+        self.tournament_timeout = tournament_timeout
+        self.sweeps = 0
+        self.reclaimed = {'rooms': 0, 'loops': 0, 'locks': 0, 'tournaments': 0}
+        self._task = None
+
+    def start(self):
+        """
+        Start the sweeper task if needed. Called when a room is created.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            logger.info(f"Room sweeper started, every {self.interval} s")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Room sweep failed: {e}")
+
+    def expired(self, game_state, loop, now):
+        """
+        Why the room should be reclaimed, or None to keep it.
+        """
+        if game_state.lifecycle == FINISHED:
+            if now - game_state.lifecycle_since >= self.finished_grace:
+                return "finished"
+        elif loop is None or not loop.running:
+            return "loop stopped"
+        elif now - game_state.last_event >= self.idle_timeout:
+            return "idle"
+        return None
+
+    async def sweep(self):
+        manager = self.manager
+        now = time.monotonic()
+        before = dict(self.reclaimed)
+
+        for room_id, game_state in list(manager.games.items()):
+            reason = self.expired(game_state, manager.loops.get(room_id), now)
+            if reason:
+                await manager.reclaim_room(room_id, reason)
+
+        for room_id in [room_id for room_id in manager.loops if room_id not in manager.games]:
+            await manager.reclaim_room(room_id, "orphaned loop")
+
+        for room_id, lock in list(manager.locks.items()):
+            if room_id not in manager.games and not lock.locked():
+                del manager.locks[room_id]
+                self.reclaimed['locks'] += 1
+
+        tournament_manager = manager.tournament_manager
+        live = {game_state.tournament_id for game_state in manager.games.values()}
+        for tournament_id in list(tournament_manager.tournaments):
+            if tournament_id in live:
+                continue
+            idle = now - tournament_manager.updated.get(tournament_id, now)
+            if tournament_id in tournament_manager.finished or idle >= self.tournament_timeout:
+                tournament_manager.remove(tournament_id)
+                self.reclaimed['tournaments'] += 1
+
+        self.sweeps += 1
+        if self.reclaimed != before:
+            freed = {kind: count - before[kind] for kind, count in self.reclaimed.items() if count != before[kind]}
+            logger.info(f"Room sweep reclaimed {freed}, live: {self.live()}")
+
+    def live(self):
+        manager = self.manager
+        rooms = {}
+        for game_state in manager.games.values():
+            rooms[game_state.lifecycle] = rooms.get(game_state.lifecycle, 0) + 1
+        return {
+            'rooms': rooms,
+            'loops': len(manager.loops),
+            'locks': len(manager.locks),
+            'tournaments': len(manager.tournament_manager.tournaments),
+            'end_game_tasks': len(manager.end_game_tasks),
+        }
+
+    def stats(self):
+        return {
+            'live': self.live(),
+            'reclaimed': dict(self.reclaimed),
+            'sweeps': self.sweeps,
+            'scheduler': self.manager.scheduler.stats(),
+            'delivery': self.manager.channel_layer.stats(),
+            'checkpoints': self.manager.checkpoints.stats(),
+            'registry': self.manager.registry.stats(),
+        }
@@ -1,3 +1,144 @@
-from django.test import TestCase
+import asyncio
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from apps.game.headless import HeadlessRunner
+from apps.game.input_log import replay_header
+from apps.game.lag import LagCompensator
+from apps.game.mailbox import Mailbox
+from apps.game.replay import ReplayEngine
+
+# A budget no tick reaches, so the watchdog never steps a room down and
+# runs do not depend on how fast the machine is
+NO_WATCHDOG = {'tick_budget_ms': 1000}
+
+
+def run_headless(ticks, setup=None, **kwargs):
+    """
+    A HeadlessRunner after `ticks` ticks. `setup` gets the runner first.
+    """
+    runner = HeadlessRunner(**kwargs)
+    if setup:
+        setup(runner)
+    asyncio.run(runner.run(ticks, warmup=0))
+    for loop in runner.loops:
+        loop.pull_physics()
+    return runner
+
+
+def final_states(runner):
+    return [(loop.game_state.pack(), loop.game_state.ai.up, loop.game_state.ai.down) for loop in runner.loops]
+
+
+class BatchPhysicsParityTest(SimpleTestCase):
+    """
+    The numpy engines step every room and AI paddle exactly like the python ones.
+    """
+    def assert_parity(self, mode, script):
+        states = {
+            engine: final_states(run_headless(
+                2000, rooms=8, mode=mode, script=script, config=dict(NO_WATCHDOG, physics_engine=engine, ai_engine=engine),
+            ))
+            for engine in ('python', 'numpy')
+        }
+        self.assertEqual(states['python'], states['numpy'])
+        self.assertTrue(any(state[6] or state[7] for state, *_ in states['python']), "no goal was scored")
+
+    def test_pvp_random(self):
+        self.assert_parity('PVP', 'random')
+
+    def test_pvc_bot(self):
+        self.assert_parity('PVC', 'bot')
+
+
+class ReplayTest(SimpleTestCase):
+    """
+    Replaying a room's input log ends in the room's live final state.
+    """
+    def assert_replays(self, mode, script, engine):
+        config = dict(NO_WATCHDOG, physics_engine=engine, ai_engine=engine)
+        runner = run_headless(2000, rooms=8, mode=mode, script=script, config=config)
+        for loop in runner.loops:
+            header = replay_header(loop)
+            replayed = asyncio.run(ReplayEngine(header, loop.input_log.entries).run_to(header['steps']))
+            self.assertEqual(replayed.pack(), loop.game_state.pack(), loop.room_id)
+
+    def test_pvc_bot(self):
+        self.assert_replays('PVC', 'bot', 'python')
+
+    def test_pvp_random(self):
+        self.assert_replays('PVP', 'random', 'python')
+
+    def test_numpy_engine(self):
+        self.assert_replays('PVC', 'bot', 'numpy')
+
+
+class SweptCollisionTest(SimpleTestCase):
+    """
+    In swept mode a match plays out the same whatever the tick rate.
+    """
+    SECONDS = 60
+
+    def scores(self, collision_mode, tick_rate):
+        def park_paddles(runner):
+            # Half height paddles at opposite edges, so rallies end either way
+            for loop in runner.loops:
+                loop.game_state.left.y = 0
+                loop.game_state.right.y = loop.config.max_paddle_y
+            runner.inputs = []
+
+        config = dict(NO_WATCHDOG, collision_mode=collision_mode, tick_rate=tick_rate, paddle={'height': 300, 'width': 16})
+        runner = run_headless(tick_rate * self.SECONDS, setup=park_paddles, rooms=6, mode='PVP', config=config)
+        return [(loop.game_state.left.score, loop.game_state.right.score) for loop in runner.loops]
+
+    def test_scores_do_not_depend_on_tick_rate(self):
+        scores = self.scores('swept', 120)
+        self.assertTrue(any(left or right for left, right in scores), "no goal was scored")
+        for tick_rate in (30, 60, 240):
+            self.assertEqual(self.scores('swept', tick_rate), scores, f"{tick_rate} Hz")
+
+    def test_discrete_mode_does(self):
+        # The same matches tunnel through the paddles at a low tick rate
+        # without swept collisions, so the test above can tell them apart
+        self.assertNotEqual(self.scores('discrete', 60), self.scores('discrete', 120))
+
+
+class MailboxTest(SimpleTestCase):
+    """
+    Events apply in arrival order and only queued inputs are bounded.
+    """
+    def test_controls_keep_their_order(self):
+        mailbox = Mailbox()
+        events = [
+            {'type': 'pause'},
+            {'type': 'set_game_started', 'user_id': 1},
+            {'type': 'resume'},
+            {'type': 'player_input', 'user_id': 1, 'seq': 1},
+            {'type': 'player_input', 'user_id': 1, 'seq': 2},
+            {'type': 'player_input', 'user_id': 2, 'seq': 1},
+            {'type': 'player_input', 'user_id': 1, 'seq': 3},
+        ]
+        for event in events:
+            mailbox.put(event)
+        self.assertEqual(mailbox.drain(), events[:3] + events[4:])
+
+    def test_only_inputs_count_against_capacity(self):
+        mailbox = Mailbox(capacity=2)
+        for user_id in (1, 2):
+            self.assertTrue(mailbox.put({'type': 'player_input', 'user_id': user_id}))
+        self.assertFalse(mailbox.put({'type': 'player_input', 'user_id': 1}))
+        self.assertTrue(mailbox.put({'type': 'stop'}))
+        self.assertEqual(mailbox.stats(), {'pending': 3, 'dropped': 1, 'coalesced': 0})
+
+
+class LagCompensatorTest(SimpleTestCase):
+    """
+    A goal waits for the late inputs of the side it is against, once.
+    """
+    def test_hold_clears_the_rewind(self):
+        lag = LagCompensator(max_rewind=10)
+        lag.rewinds['left'] = 3
+        self.assertEqual([lag.hold_goal(step, 'left') for step in range(100, 104)], [True, True, True, False])
+        self.assertEqual(lag.rewinds['left'], 0)
+        # A goal much later is not held for an input long gone
+        self.assertFalse(lag.hold_goal(500, 'left'))
@@ -0,0 +1,141 @@
+"""
+Tournament state shared by every game server process through Redis, so a
+tournament works whichever process each player's socket lands on.
+
+A tournament is one hash, game:tournament:<tournament_id>:
+
+    players    JSON list of user ids in seed order
+    version    bumped by every result written
+    <match>    user id of the winner of that match
+
+A Bracket follows from the players alone (see bracket.py), so the results
+are all that changes. Each transition is one MULTI/EXEC transaction that
+also reads the whole hash back:
+- load() creates the tournament unless it exists, which makes the first
+  connection on any process agree on one player order;
+- record_result() sets a match's winner only if it has none yet (HSETNX).
+Every process keeps the Bracket of the tournaments it has seen as a read
+cache and catches it up with the results it gets back from Redis. The key
+expires ttl seconds after the last transition.
+"""
+import logging, asyncio, json, time
+
+from apps.game.bracket import Bracket
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "game:tournament:"
+
+
+class TournamentManager:
+    """
+    Brackets of the tournaments played on this process, kept in step with
+    Redis.
+    """
+    def __init__(self, redis_client, ttl=1800):
+        self.redis = redis_client
+        self.ttl = ttl  # Seconds a tournament outlives its last transition
+        self.tournaments = {}  # {tournament_id: Bracket}, the read cache
+        self.versions = {}  # {tournament_id: version of the cached Bracket}
+        self.updated = {}  # {tournament_id: time.monotonic() of the last change}
+        self.finished = set()  # Tournaments that have a winner
+
+    async def load(self, tournament_id, players=None):
+        """
+        Refresh the Bracket of a tournament from Redis and return it. With
+        `players`, the tournament is created unless it exists. Returns None
+        for an unknown tournament.
+        """
+        try:
+            state = await asyncio.to_thread(self.fetch, tournament_id, players)
+        except Exception as e:
+            logger.error(f"Could not load tournament {tournament_id}: {e}")
+            return self.tournaments.get(tournament_id)
+        return self.cache(tournament_id, state)
+
+    def remove(self, tournament_id):
+        """
+        Drop a tournament from the cache. Its Redis key expires on its own.
+        """
+        self.tournaments.pop(tournament_id, None)
+        self.versions.pop(tournament_id, None)
+        self.updated.pop(tournament_id, None)
+        self.finished.discard(tournament_id)
+        logger.info(f"Tournament with id {tournament_id} has been removed.")
+
+    def match(self, tournament_id, room_id):
+        """
+        The cached Match played in a room, or None.
+        """
+        bracket = self.tournaments.get(tournament_id)
+        return bracket.rooms.get(room_id) if bracket else None
+
+    async def record_result(self, tournament_id, room_id, winner):
+        """
+        Move the winner of a room's match up the bracket. Returns the
+        Match they play next, None if they won the tournament.
+        """
+        bracket = await self.load(tournament_id)
+        if not bracket:
+            raise ValueError(f"Tournament {tournament_id} not found")
+        match = bracket.check(room_id, winner)
+        recorded, state = await asyncio.to_thread(self.write_result, tournament_id, match.number, str(winner))
+        bracket = self.cache(tournament_id, state)
+        if not bracket:
+            raise ValueError(f"Tournament {tournament_id} expired")
+        if not recorded:
+            raise ValueError(f"Match {match.number} of tournament {tournament_id} was recorded elsewhere")
+        return bracket.current.get(str(winner))
+
+    def cache(self, tournament_id, state):
+        """
+        Bring the cached Bracket up to the hash read from Redis.
+        """
+        if not state or 'players' not in state:
+            return None
+        version = int(state['version'])
+        bracket = self.tournaments.get(tournament_id)
+        if bracket is None:
+            bracket = self.tournaments[tournament_id] = Bracket(tournament_id, json.loads(state['players']))
+            logger.info(f"Tournament with id {tournament_id} has been added: {len(bracket.players)} players, {bracket.rounds} rounds.")
+        if self.versions.get(tournament_id) != version:
+            bracket.catch_up({int(field): winner for field, winner in state.items() if field.isdigit()})
+            self.versions[tournament_id] = version
+            self.updated[tournament_id] = time.monotonic()
+        if bracket.winner is not None:
+            self.finished.add(tournament_id)
+        return bracket
+
+    def fetch(self, tournament_id, players):
+        """
+        Runs in a worker thread.
+        """
+        key = KEY_PREFIX + str(tournament_id)
+        pipe = self.redis.pipeline()
+        if players is not None:
+            pipe.hsetnx(key, 'players', json.dumps([str(player) for player in players]))
+            pipe.hsetnx(key, 'version', 0)
+            pipe.expire(key, self.ttl)
+        pipe.hgetall(key)
+        return pipe.execute()[-1]
+
+    def write_result(self, tournament_id, number, winner):
+        """
+        Returns (recorded, state). Runs in a worker thread.
+
+        The version only moves when the result is new, so a duplicate or
+        losing report does not make every node reload the bracket. The key
+        is watched, so a report racing another one runs again.
+        """
+        key = KEY_PREFIX + str(tournament_id)
+
+        def record(pipe):
+            known = pipe.hexists(key, number)
+            pipe.multi()
+            if not known:
+                pipe.hset(key, number, winner)
+                pipe.hincrby(key, 'version', 1)
+                pipe.expire(key, self.ttl)
+            pipe.hgetall(key)
+
+        results = self.redis.transaction(record, key)
+        return len(results) > 1, results[-1]  # A known result only ran HGETALL
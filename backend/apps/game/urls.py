@@ -5,4 +5,5 @@ urlpatterns = [
     # Example URL patterns
     path('', views.some_view, name='some_view'),
     path('another/', views.another_view, name='another_view'),
+    path('stats/', views.stats_view, name='stats'),
 ]
@@ -1,7 +1,12 @@
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from .manager import game_manager
 
 def some_view(request):
     return HttpResponse("This is the some_view response.")
 
 def another_view(request):
     return HttpResponse("This is the another_view response.")
+
+def stats_view(request):
+    # Daphne serves HTTP in the same process, so this sees the live rooms
+    return JsonResponse(game_manager.stats())
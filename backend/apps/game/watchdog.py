@@ -0,0 +1,88 @@
+import logging
+logger = logging.getLogger(__name__)
+
+NORMAL = 0
+REDUCED_BROADCAST = 1
+REDUCED_AI = 2
+DEGRADED = 3
+
+LEVEL_NAMES = {
+    NORMAL: "normal",
+    REDUCED_BROADCAST: "reduced broadcast rate",
+    REDUCED_AI: "reduced AI prediction rate",
+    DEGRADED: "degraded",
+}
+
+
+class TickBudget:
+    """
+    Tracks a room's tick times against its budget and steps the room down
+    one level at a time while it stays over budget, and back up once it has
+    been within budget for a while. Overruns are judged per window of ticks
+    so a single slow tick does not change anything.
+    """
+    def __init__(self, room_id, budget, window=60, overrun_ratio=0.5, recover_windows=4):
+        self.room_id = room_id
+        self.budget = budget  # Seconds one tick of this room may take
+        self.window = window
+        self.overrun_ratio = overrun_ratio
+        self.recover_windows = recover_windows
+        self.level = NORMAL
+        self.overruns = 0  # Total over the room's lifetime
+        self.window_ticks = 0
+        self.window_overruns = 0
+        self.clean_windows = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def record(self, duration, late=False):
+        """
+        Record one tick. `late` marks ticks where the shared scheduler itself
+        ran over, which counts as an overrun for every room. Returns True if
+        the level changed.
+        """
+        self.last_duration = duration
+        if duration > self.max_duration:
+            self.max_duration = duration
+        if late or duration > self.budget:
+            self.overruns += 1
+            self.window_overruns += 1
+        self.window_ticks += 1
+        if self.window_ticks < self.window:
+            return False
+
+        ratio = self.window_overruns / self.window_ticks
+        self.window_ticks = 0
+        self.window_overruns = 0
+        if ratio >= self.overrun_ratio:
+            self.clean_windows = 0
+            if self.level < DEGRADED:
+                self.set_level(self.level + 1, ratio)
+                return True
+        elif ratio == 0:
+            self.clean_windows += 1
+            if self.level > NORMAL and self.clean_windows >= self.recover_windows:
+                self.clean_windows = 0
+                self.set_level(self.level - 1, ratio)
+                return True
+        else:
+            self.clean_windows = 0
+        return False
+
+    def set_level(self, level, ratio):
+        direction = "down" if level > self.level else "up"
+        self.level = level
+        log = logger.warning if direction == "down" else logger.info
+        log(
+            f"Room {self.room_id} stepped {direction} to '{LEVEL_NAMES[level]}' "
+            f"({ratio:.0%} of last {self.window} ticks over {self.budget * 1000:.2f} ms budget, "
+            f"{self.overruns} overruns total)"
+        )
+
+    def stats(self):
+        return {
+            'level': LEVEL_NAMES[self.level],
+            'overruns': self.overruns,
+            'last_duration_ms': self.last_duration * 1000,
+            'max_duration_ms': self.max_duration * 1000,
+        }
@@ -6,11 +6,14 @@ import time
 import logging
 from redis.exceptions import LockError
 import uuid
+from django.conf import settings
+
+from apps.game.bracket import Bracket
 
 logger = logging.getLogger(__name__)
 
 MAX_WAIT_TIME = 30
-TOURNAMENT_SIZE = 4
+TOURNAMENT_SIZE = settings.TOURNAMENT_SIZE
 
 class MatchmakingManager:
     QUEUE_KEYS = {
@@ -149,11 +152,17 @@ class MatchmakingManager:
         """
         logger.info("_notify_players() called.")
         users = data.get('users')
+        # Tournament players go straight to their own first match, all of
+        # the first round plays at once
+        bracket = Bracket(data['tournament_id'], users) if data.get('game_type') == "TRNMT" else None
         for user_id in users:
             logger.info(f"user_id: {user_id}")
             data.update({
                 'user_id': user_id
                 })
+            if bracket:
+                match = bracket.first_match(user_id)
+                data.update({'room_id': match.room_id, 'next_players': match.players})
             room_url = generate_shared_game_room_url(**data)
             try:
 
@@ -176,7 +185,6 @@ matchmaking_manager = MatchmakingManager()
 
 """ Helper functions """
 import jwt
-from django.conf import settings
 
 SECRET_KEY = settings.SECRET_KEY
 
@@ -5,7 +5,6 @@ import asyncio
 
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
-# from apps.game.manager import game_manager  # Import GameManager instance
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
@@ -21,6 +20,7 @@ import apps.matchmaking.routing
 # Define application routing
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
+    "lifespan": apps.game.routing.lifespan,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             apps.matchmaking.routing.websocket_urlpatterns +
@@ -28,10 +28,3 @@ application = ProtocolTypeRouter({
         )
     ),
 })
-
-# # Start GameManager's main loop at ASGI startup
-# async def startup():
-#     asyncio.create_task(game_manager.start())
-
-# # Ensure the startup coroutine runs when ASGI is initialized
-# asyncio.get_event_loop().run_until_complete(startup())
\ No newline at end of file
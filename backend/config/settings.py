@@ -202,6 +202,17 @@ CELERY_BROKER_URL = 'redis://redis:6379/0'  # Use the Redis service from Docker
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Match replays, see apps/game/input_log.py. Off unless set, e.g. to
+# /uploads/replays; only the newest replays are kept, see state.default_config()
+GAME_REPLAY_DIR = os.getenv('GAME_REPLAY_DIR') or None
+
+# Game server processes behind the load balancer. With more than one, rooms
+# are leased in Redis so each runs on one of them, see apps/game/registry.py
+GAME_NODES = int(os.getenv('GAME_NODES', 1))
+
+# Players per tournament, 2 to 256. See apps/game/bracket.py
+TOURNAMENT_SIZE = int(os.getenv('TOURNAMENT_SIZE', 4))
+
 
 # 42OAuth
 CLIENT_ID = os.getenv('CLIENT_ID')
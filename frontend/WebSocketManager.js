@@ -11,6 +11,7 @@ class WebSocketManager {
         }
 
         const socket = new WebSocket(url);
+        socket.binaryType = 'arraybuffer'; // Game state frames are binary
 
         this.messageQueue[name] = []; // Initialize message queue for this socket
 
@@ -32,6 +33,11 @@ class WebSocketManager {
             }
         
             localStorage.removeItem(`${name}_url`); // ✅ Removes any other stored WebSocket URLs
+            if (this.sockets[name] === socket) {
+                // Closed by the server, let connect() open a new one
+                delete this.sockets[name];
+                delete this.messageQueue[name];
+            }
             if (onClose) onClose(event);
         };
 
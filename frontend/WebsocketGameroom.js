@@ -2,29 +2,53 @@ import { wsManager } from './WebSocketManager.js';
 import { showScreen } from './showScreen.js';
 import { updateServerState, resetClientState } from './state.js';
 import { DOM } from './dom.js';
+import { decodeFrame, resetFrameDecoder, setFramePlayers } from './frameDecoder.js';
+import { startClockSync, handleClockSync } from './clockSync.js';
+import { setOwnSide, resetPrediction } from './prediction.js';
+
+// Sent when the server hands its rooms over before a restart. The room
+// resumes from its checkpoint once we are back, see backend checkpoint.py
+const DRAINING_CLOSE_CODE = 4503;
+const RECONNECT_DELAY_MS = 1000;
+const MAX_RECONNECTS = 10;
+let reconnects = 0;
 
 export function connectToGame(gameRoomUrl) {
 	let existingGameUrl = localStorage.getItem("game_url");
     if (!gameRoomUrl && existingGameUrl) {
         console.log(`Reconnecting to existing game: ${existingGameUrl}`);
         wsManager.connect('game', existingGameUrl, handleGameMessage, handleGameClose);
+        startClockSync();
         return;
     }
 
     if (gameRoomUrl) {
         console.log(`Connecting to new game: ${gameRoomUrl}`);
         wsManager.connect('game', gameRoomUrl, handleGameMessage, handleGameClose);
+        startClockSync();
     }
 }
 
 function handleGameMessage(event) {
+    if (event.data instanceof ArrayBuffer) {
+        reconnects = 0;
+        const frame = decodeFrame(event.data);
+        if (frame)
+            updateServerState(frame);
+        return;
+    }
+
     const data = JSON.parse(event.data);
 	let winner;
 	let gameOverMessage;
 
     switch (data.type) {
-        case 'state_update':
-            updateServerState(data);
+        case 'players':
+            setFramePlayers(data.players);
+            setOwnSide(data.players.ids);
+            break;
+        case 'clock_sync':
+            handleClockSync(data);
             break;
 		case 'ai_game_over':
 			console.log("AI Game Over!", data);
@@ -104,8 +128,9 @@ function handleGameMessage(event) {
 			} else {
 				console.log("Match finished!", data);
 				
-				let next_player1 = data.next.players[0]
-				let next_player2 = data.next.players[1]
+				// A side is null while its match is still being played
+				let next_player1 = data.next.players[0] ?? "TBD"
+				let next_player2 = data.next.players[1] ?? "TBD"
 				let url = data.next.url
 				gameOverMessage = `Match finished! ${winner} wins!`;
 				let nextGameMessage = `Next Match ${next_player1} vs ${next_player2}!`;
@@ -129,6 +154,18 @@ function handleGameMessage(event) {
 
 function handleGameClose(event) {
     localStorage.removeItem("game_url");
+    resetFrameDecoder();
+    resetPrediction();
+    if (event.code === DRAINING_CLOSE_CODE && reconnects < MAX_RECONNECTS) {
+        reconnects++;
+        const url = event.target.url;
+        console.warn(`Game server is restarting, reconnecting in ${RECONNECT_DELAY_MS} ms`);
+        setTimeout(() => {
+            connectToGame(url);
+            wsManager.send('game', { action: 'player_ready' });
+        }, RECONNECT_DELAY_MS);
+        return;
+    }
     console.warn('Game WebSocket closed.');
 }
 
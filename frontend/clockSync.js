@@ -0,0 +1,38 @@
+import { wsManager } from './WebSocketManager.js';
+
+// Estimates the offset between performance.now() and the server clock that
+// is carried in every state frame (server_time, in ms).
+
+const SAMPLES = 5;
+const SAMPLE_INTERVAL = 200;
+
+let offset = null;
+let bestRtt = Infinity;
+
+export function startClockSync() {
+    offset = null;
+    bestRtt = Infinity;
+    for (let i = 0; i < SAMPLES; i++) {
+        setTimeout(() => {
+            wsManager.send('game', { action: 'clock_sync', client_time: performance.now() });
+        }, i * SAMPLE_INTERVAL);
+    }
+}
+
+// Keep the sample with the lowest round trip, it has the least error
+export function handleClockSync(data) {
+    const now = performance.now();
+    const rtt = now - data.client_time;
+    if (rtt < bestRtt) {
+        bestRtt = rtt;
+        offset = data.server_time - (data.client_time + now) / 2;
+    }
+}
+
+export function isClockSynced() {
+    return offset !== null;
+}
+
+export function serverNow() {
+    return performance.now() + offset;
+}
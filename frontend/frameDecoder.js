@@ -0,0 +1,94 @@
+// Decoder for the binary game state frames sent by the server.
+// The layout is documented in backend/apps/game/protocol.py.
+
+const KEYFRAME = 1;
+const DELTA = 2;
+
+const FLAG_BALL_RENDER = 1 << 0;
+const FLAG_GAME_STARTED = 1 << 1;
+const FLAG_PAUSED = 1 << 2;
+const FLAG_DEGRADED = 1 << 3;
+const PHASE_SHIFT = 4;
+const PHASES = ['playing', 'countdown', 'serving', 'over'];
+
+const HEADER_SIZE = 12;
+const POSITION_SCALE = 65535;
+const VELOCITY_SCALE = 1000;
+const PADDLE_WIDTH_RATIO = 0.02;
+
+// [size, reader] per field, in mask bit order
+const FIELDS = [
+    [2, (view, offset) => view.getUint16(offset, true) / POSITION_SCALE], // ball.x
+    [2, (view, offset) => view.getUint16(offset, true) / POSITION_SCALE], // ball.y
+    [2, (view, offset) => view.getInt16(offset, true) / VELOCITY_SCALE],  // ball.vx
+    [2, (view, offset) => view.getInt16(offset, true) / VELOCITY_SCALE],  // ball.vy
+    [2, (view, offset) => view.getUint16(offset, true) / POSITION_SCALE], // left.y
+    [2, (view, offset) => view.getUint16(offset, true) / POSITION_SCALE], // right.y
+    [1, (view, offset) => view.getUint8(offset)],                         // left.score
+    [1, (view, offset) => view.getUint8(offset)],                         // right.score
+    [2, (view, offset) => view.getUint16(offset, true)],                  // left.seq
+    [2, (view, offset) => view.getUint16(offset, true)],                  // right.seq
+];
+
+let values = new Array(FIELDS.length).fill(0);
+let hasKeyframe = false;
+let players = { left: "", right: "" };
+
+export function resetFrameDecoder() {
+    values = new Array(FIELDS.length).fill(0);
+    hasKeyframe = false;
+    players = { left: "", right: "" };
+}
+
+export function setFramePlayers(serverPlayers) {
+    players = { left: serverPlayers.left, right: serverPlayers.right };
+}
+
+// Returns data in the shape updateServerState() expects (normalized 0..1),
+// or null if the frame is a delta and no keyframe has been seen yet.
+export function decodeFrame(buffer) {
+    const view = new DataView(buffer);
+    const kind = view.getUint8(0);
+    const flags = view.getUint8(1);
+    const tick = view.getUint32(2, true);
+    const serverTime = view.getUint32(6, true);
+    const mask = view.getUint16(10, true);
+
+    if (kind === KEYFRAME) {
+        hasKeyframe = true;
+    } else if (kind !== DELTA || !hasKeyframe) {
+        return null;
+    }
+
+    let offset = HEADER_SIZE;
+    for (let bit = 0; bit < FIELDS.length; bit++) {
+        if (mask & (1 << bit)) {
+            const [size, read] = FIELDS[bit];
+            values[bit] = read(view, offset);
+            offset += size;
+        }
+    }
+
+    return {
+        type: 'state_update',
+        tick: tick,
+        server_time: serverTime,
+        game_started: (flags & FLAG_GAME_STARTED) !== 0,
+        paused: (flags & FLAG_PAUSED) !== 0,
+        degraded: (flags & FLAG_DEGRADED) !== 0,
+        phase: PHASES[(flags >> PHASE_SHIFT) & 3],
+        players: players,
+        ball: {
+            x: values[0],
+            y: values[1],
+            vx: values[2],
+            vy: values[3],
+            render: (flags & FLAG_BALL_RENDER) !== 0,
+        },
+        paddles: {
+            left: { x: 0, y: values[4], score: values[6] },
+            right: { x: 1 - PADDLE_WIDTH_RATIO, y: values[5], score: values[7] },
+        },
+        acks: { left: values[8], right: values[9] },
+    };
+}
@@ -12,6 +12,7 @@ import { localTournament, startTournamentMatch } from './localTournament.js';
 import { lgPlayers } from './render_local.js'
 import { getCookie, setCookie } from './cookie.js';
 import { generateUUID } from './generateUUID.js';
+import { sendInput } from './prediction.js';
 
 
 DOM.canvas.width = GAME_CONFIG.canvasWidth;
@@ -169,13 +170,8 @@ function handleInput(event, isPressed) {
         if (event.key === "ArrowUp") localState.paddles.right.up = isPressed;
         if (event.key === "ArrowDown") localState.paddles.right.down = isPressed;
     } else if (wsManager.sockets['game']?.readyState === WebSocket.OPEN) {
-        if (up || down) {
-            wsManager.send('game', {
-                action: "input",
-                up: up && isPressed,
-                down: down && isPressed,
-            });
-        }
+        if (up || down)
+            sendInput(up && isPressed, down && isPressed);
     }
 }
 
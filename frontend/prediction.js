@@ -0,0 +1,77 @@
+// Client-side prediction of the player's own paddle.
+// Inputs carry a sequence number and every frame carries, per side, the last
+// sequence the server applied (see backend/apps/game/protocol.py). Our paddle
+// moves locally as soon as a key changes; once the server has applied every
+// input we sent, the prediction is pulled towards the server's position, so
+// the server stays authoritative.
+// Inputs also carry when the key was pressed on the server clock, so the
+// server can judge them against where our paddle was then (see
+// backend/apps/game/lag.py).
+import { GAME_CONFIG } from './config.js';
+import { wsManager } from './WebSocketManager.js';
+import { isClockSynced, serverNow } from './clockSync.js';
+
+const PADDLE_SPEED_RATIO = 550 / 600; // Server paddle speed, in canvas heights per second
+const PADDLE_HEIGHT_RATIO = 0.2;
+const CORRECTION_FACTOR = 0.2;
+const MAX_STEP = 0.1;
+
+let seq = 0;
+let side = null;
+let input = { up: false, down: false };
+let predictedY = null;
+let lastUpdate = null;
+
+export function resetPrediction() {
+    seq = 0;
+    side = null;
+    input = { up: false, down: false };
+    predictedY = null;
+    lastUpdate = null;
+}
+
+// `ids` is {left: user_id, right: user_id} from the 'players' message
+export function setOwnSide(ids) {
+    const userId = localStorage.getItem('user_id');
+    if (ids && ids.left === userId)
+        side = 'left';
+    else if (ids && ids.right === userId)
+        side = 'right';
+    else
+        side = null;
+}
+
+export function ownSide() {
+    return side;
+}
+
+export function sendInput(up, down) {
+    seq = (seq + 1) & 0xFFFF;
+    input = { up, down };
+    const message = { action: 'input', up, down, seq };
+    if (isClockSynced())
+        message.time = Math.round(serverNow()) >>> 0; // Wraps like server_time
+    wsManager.send('game', message);
+}
+
+// Paddle y to draw this render frame. `serverY` is from the last frame,
+// `ack` the sequence it acknowledged for our side and `age` its age in seconds.
+export function predictPaddle(serverY, ack, age) {
+    const now = performance.now() / 1000;
+    const dt = lastUpdate === null ? 0 : Math.min(now - lastUpdate, MAX_STEP);
+    lastUpdate = now;
+    if (predictedY === null)
+        predictedY = serverY;
+
+    const velocity = PADDLE_SPEED_RATIO * GAME_CONFIG.canvasHeight * ((input.down ? 1 : 0) - (input.up ? 1 : 0));
+    const maxY = GAME_CONFIG.canvasHeight * (1 - PADDLE_HEIGHT_RATIO);
+    predictedY = Math.max(0, Math.min(predictedY + velocity * dt, maxY));
+
+    // Reconcile only once the server has seen everything we sent; until then
+    // its position is missing our latest input and would pull us back
+    if (ack === seq) {
+        const serverNow = Math.max(0, Math.min(serverY + velocity * age, maxY));
+        predictedY += (serverNow - predictedY) * CORRECTION_FACTOR;
+    }
+    return predictedY;
+}
@@ -1,8 +1,19 @@
 import { DOM } from './dom.js';
 import { clientState, serverState } from './state.js';
+import { isClockSynced, serverNow } from './clockSync.js';
+import { ownSide, predictPaddle } from './prediction.js';
 
 const EXTRAPOLATION_FACTOR = 0.3;
 const SERVER_UPDATE_INTERVAL = 0.05;
+const MAX_EXTRAPOLATION = 0.1;
+
+// Seconds since the server produced the last frame, from the synced clock
+function frameAge() {
+    if (!isClockSynced() || serverState.serverTime === null)
+        return SERVER_UPDATE_INTERVAL;
+    const age = (serverNow() - serverState.serverTime) / 1000;
+    return Math.max(0, Math.min(age, MAX_EXTRAPOLATION));
+}
 
 export function clearCanvas() {
 	DOM.ctx.clearRect(0, 0, DOM.canvas.width, DOM.canvas.height);
@@ -26,14 +37,19 @@ export function extrapolateState() {
     const serverBall = serverState.ball;
     const clientBall = clientState.ball;
 
-    const predictedX = serverBall.x + (serverBall.vx * SERVER_UPDATE_INTERVAL);
-    const predictedY = serverBall.y + (serverBall.vy * SERVER_UPDATE_INTERVAL);
+    const age = frameAge();
+    const predictedX = serverBall.x + (serverBall.vx * age);
+    const predictedY = serverBall.y + (serverBall.vy * age);
 
     clientBall.x += (predictedX - clientBall.x) * EXTRAPOLATION_FACTOR;
     clientBall.y += (predictedY - clientBall.y) * EXTRAPOLATION_FACTOR;
 
-    clientState.paddles.left.y +=
-        (serverState.paddles.left.y - clientState.paddles.left.y) * 0.2;
-    clientState.paddles.right.y +=
-        (serverState.paddles.right.y - clientState.paddles.right.y) * 0.2;
+    // Our own paddle is predicted from local input, the other one follows the server
+    for (const side of ['left', 'right']) {
+        const paddle = clientState.paddles[side];
+        if (side === ownSide())
+            paddle.y = predictPaddle(serverState.paddles[side].y, serverState.acks[side], age);
+        else
+            paddle.y += (serverState.paddles[side].y - paddle.y) * 0.2;
+    }
 }
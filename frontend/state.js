@@ -77,6 +77,9 @@ export let clientState = {
 };
 
 export let serverState = {
+    tick: 0,
+    serverTime: null,
+    acks: { left: 0, right: 0 },
     players: {
         left: "",
         right: "",
@@ -125,6 +128,10 @@ export function resetClientState() {
 
 export function updateServerState(serverData) {
     
+    serverState.tick = serverData.tick;
+    serverState.serverTime = serverData.server_time;
+    serverState.acks.left = serverData.acks.left;
+    serverState.acks.right = serverData.acks.right;
     serverState.players.left = serverData.players.left;
     serverState.players.right = serverData.players.right;
 